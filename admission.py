@@ -0,0 +1,120 @@
+"""
+Admission control for pipeline endpoints.
+
+Each worker runs at most `max_in_flight` pipelines at once, and each
+endpoint at most its own limit. Requests beyond that wait in a short FIFO
+queue (at most `max_queue` entries, for at most `queue_timeout` seconds);
+when the queue is full or the wait runs out they are rejected with a
+Retry-After estimate, so admitted requests keep predictable latency during
+bursts instead of everyone timing out.
+
+All state lives on the worker's shared event loop (see shared_loop), so no
+locks are needed; acquire() and release() must be called from that loop.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+
+from metrics import record_admission
+
+
+class AdmissionRejected(Exception):
+    """The endpoint is saturated; retry after `retry_after` seconds"""
+
+    def __init__(self, endpoint, retry_after):
+        super().__init__(f"Too many concurrent '{endpoint}' requests")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+def parse_limits(spec):
+    """Per-endpoint limits from "create_category=4,refresh_news=6" ({} when empty)"""
+    limits = {}
+    for part in (spec or '').split(','):
+        if part.strip():
+            endpoint, _, limit = part.partition('=')
+            limits[endpoint.strip()] = int(limit)
+    return limits
+
+
+class AdmissionController:
+    """Bounded in-flight pipelines (global and per endpoint) with a short wait queue"""
+
+    def __init__(self, max_in_flight=8, max_queue=16, queue_timeout=5, endpoint_limits=None):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.endpoint_limits = dict(endpoint_limits or {})
+        self._in_flight = 0
+        self._endpoint_in_flight = {}
+        self._waiters = deque()
+        # Moving average of how long an admitted request holds its slot
+        self._hold_seconds = 5.0
+
+    def _has_room(self, endpoint):
+        limit = self.endpoint_limits.get(endpoint)
+        return self._in_flight < self.max_in_flight and (
+            limit is None or self._endpoint_in_flight.get(endpoint, 0) < limit
+        )
+
+    def _take(self, endpoint):
+        self._in_flight += 1
+        self._endpoint_in_flight[endpoint] = self._endpoint_in_flight.get(endpoint, 0) + 1
+
+    def retry_after(self):
+        """Seconds until a slot is likely free: queued work spread over every slot"""
+        backlog = (len(self._waiters) + 1) / self.max_in_flight
+        return max(1, math.ceil(self._hold_seconds * backlog))
+
+    async def acquire(self, endpoint):
+        """Take a slot for `endpoint`, waiting in the queue if needed; raises AdmissionRejected"""
+        # Waiters still queued are blocked by their endpoint's limit (a free
+        # global slot would have gone to them), so they do not hold this one up
+        if self._has_room(endpoint) and not any(self._has_room(e) for e, _ in self._waiters):
+            self._take(endpoint)
+            record_admission(endpoint, 'admitted')
+            return time.monotonic()
+        if len(self._waiters) >= self.max_queue:
+            record_admission(endpoint, 'rejected')
+            raise AdmissionRejected(endpoint, self.retry_after())
+
+        waiter = (endpoint, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            # Shielded so a timeout cannot cancel a slot granted at the same moment
+            await asyncio.wait_for(asyncio.shield(waiter[1]), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter[1].done():
+                if isinstance(e, asyncio.CancelledError):
+                    self._release(endpoint)
+                    raise
+            else:
+                self._waiters.remove(waiter)
+                waiter[1].cancel()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                record_admission(endpoint, 'rejected')
+                raise AdmissionRejected(endpoint, self.retry_after()) from None
+        record_admission(endpoint, 'queued')
+        return time.monotonic()
+
+    def release(self, endpoint, admitted_at=None):
+        """Give back `endpoint`'s slot and hand it to the next waiter that fits"""
+        if admitted_at is not None:
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * (time.monotonic() - admitted_at)
+        self._release(endpoint)
+
+    def _release(self, endpoint):
+        self._in_flight -= 1
+        self._endpoint_in_flight[endpoint] -= 1
+        # FIFO, except that a waiter whose endpoint is at its limit does not
+        # block waiters of other endpoints
+        for waiter in list(self._waiters):
+            waiting_endpoint, future = waiter
+            if self._has_room(waiting_endpoint):
+                self._waiters.remove(waiter)
+                self._take(waiting_endpoint)
+                future.set_result(None)
+            if self._in_flight >= self.max_in_flight:
+                break
@@ -1,16 +1,14 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, Response, request, jsonify, redirect, send_file
+import click
 from flask_cors import CORS
 from dotenv import load_dotenv
 load_dotenv()
 import os
-import google.generativeai as genai
 import json
 import requests
 import datetime
-import firebase_admin
-from firebase_admin import credentials, firestore
-import uuid
 import logging
+import threading
 import xml.etree.ElementTree as ET
 from urllib.parse import quote, urljoin, urlparse, parse_qs, unquote
 import re
@@ -18,9 +16,31 @@ import time
 import hashlib
 import asyncio
 import base64
-from bs4 import BeautifulSoup
+import copy
+import functools
+import admission
+import circuit_breaker
+import deletion
+import event_log
+import gemini_client
+import http_cache
+import image_probe
+import image_proxy
+import metrics
+import prompt_index
+import shared_loop
+import single_flight
+import storage
+import summarizer
+import topics
+import ttl_cache
+from deadline import Deadline, DeadlineExceeded
+from metrics import stage_timer, timed_stage, track_upstream, pipeline_in_flight, record_cache, record_google_news_decode, record_deadline_exceeded, record_enhancement_tier
 
-app = Flask(__name__)
+# Firebase, Gemini and BeautifulSoup are imported on first use (see the lazy
+# clients below) so importing this module and forking workers stays cheap.
+
+api = Blueprint('api', __name__)
 
 # Simplified CORS solution that fixes the duplicate header issue
 CORS_ALLOWED_ORIGINS = [ 
@@ -28,45 +48,175 @@ CORS_ALLOWED_ORIGINS = [
     "https://newgenius-frontend.vercel.app"
 ]
 
-# Configure app with simple CORS - this is the ONLY place CORS headers should be set
-# Using supports_credentials=True and not setting methods/headers to let Flask-CORS handle it all
-CORS(app, origins=CORS_ALLOWED_ORIGINS, supports_credentials=True)
-
-# Remove the before_request handler - it's causing duplicate headers
-# @app.before_request 
-# def handle_preflight():
-#     ...
-
-# We've completely removed all custom CORS handling
-# Flask-CORS extension will handle everything automatically
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-service_account_key = json.loads(os.environ.get("FIREBASE_SERVICE_ACCOUNT_PATH"))
-
-# --- Firebase Initialization ---
-try:
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(service_account_key)
-        firebase_admin.initialize_app(cred)
-    db = firestore.client()
-    print("Firebase initialized successfully.")
-except Exception as e:
-    print(f"Error initializing Firebase: {e}")
-
-# --- Gemini Model Initialization ---
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('models/gemini-2.0-flash')
+GEMINI_MODEL_NAME = 'models/gemini-2.0-flash'
+# Gemini calls in flight per worker, and the default per-call timeout
+GEMINI_MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', 8))
+GEMINI_TIMEOUT_SECONDS = float(os.environ.get('GEMINI_TIMEOUT_SECONDS', 30))
+# Consecutive Gemini failures that open its circuit, and how long it stays open
+GEMINI_BREAKER_FAILURES = int(os.environ.get('GEMINI_BREAKER_FAILURES', 5))
+GEMINI_BREAKER_RESET_SECONDS = float(os.environ.get('GEMINI_BREAKER_RESET_SECONDS', 30))
+# 'firestore' in production; 'sqlite' or 'memory' for local/offline runs
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "firestore").lower()
+
+# ETag/Last-Modified validators + parsed results for RSS feeds and article pages
+http_validators = http_cache.ValidatorCache(int(os.environ.get('HTTP_VALIDATOR_CACHE_SIZE', 1000)))
+
+# Per-worker TTL caches in front of keyword generation (by prompt), source
+# fetches (by keyword set) and image resolution (by article URL)
+keyword_cache = ttl_cache.TTLCache(
+    'keywords',
+    int(os.environ.get('KEYWORD_CACHE_SIZE', 1000)),
+    float(os.environ.get('KEYWORD_CACHE_TTL_SECONDS', 6 * 3600)),
+)
+source_cache = ttl_cache.TTLCache(
+    'sources',
+    int(os.environ.get('SOURCE_CACHE_SIZE', 200)),
+    float(os.environ.get('SOURCE_CACHE_TTL_SECONDS', 900)),
+)
+# User-triggered refreshes only reuse source fetches this recent (e.g. one
+# just made by the prewarmer or a concurrent request)
+REFRESH_SOURCE_MAX_AGE_SECONDS = float(os.environ.get('REFRESH_SOURCE_MAX_AGE_SECONDS', 60))
+image_cache = ttl_cache.TTLCache(
+    'image_resolution',
+    int(os.environ.get('IMAGE_CACHE_SIZE', 5000)),
+    float(os.environ.get('IMAGE_CACHE_TTL_SECONDS', 24 * 3600)),
+)
+
+# Concurrent identical work is done once and shared: refreshes of the same
+# category, source fetches and relevance filtering of the same keyword set, and
+# enhancement and image resolution of the same article
+refresh_flights = single_flight.SingleFlight('refresh')
+source_flights = single_flight.SingleFlight('fetch_sources')
+filter_flights = single_flight.SingleFlight('filter')
+enhance_flights = single_flight.SingleFlight('enhance')
+image_flights = single_flight.SingleFlight('image')
+
+# Similar prompts ("AI", "A.I. news", "artificial intelligence") map to one
+# canonical topic, which keys the keyword cache and the topic tracker
+canonical_prompts = prompt_index.PromptIndex(
+    threshold=float(os.environ.get('PROMPT_SIMILARITY_THRESHOLD', 0.55)),
+    max_topics=int(os.environ.get('PROMPT_INDEX_SIZE', 5000)),
+)
+
+# Heavy-hitter counts of requested prompts and keyword sets, for prewarming
+popular_topics = topics.TopicTracker(
+    int(os.environ.get('TOPIC_TRACKER_CAPACITY', 200)), prompt_key=canonical_prompts.canonicalize
+)
+
+# --- Lazy Client Initialization ---
+# Clients are created on first use, i.e. after a pre-fork server has forked its
+# workers, and are dropped in forked children so no gRPC channel or socket is
+# ever shared between processes.
+_clients = {}
+# Reentrant: some factories build on other lazy clients (e.g. the repository on get_db())
+_clients_lock = threading.RLock()
+
+def _reset_clients_after_fork():
+    global _clients_lock
+    _clients.clear()
+    _clients_lock = threading.RLock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_clients_after_fork)
+
+def _get_client(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+def _init_firestore():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    
+    try:
+        if not firebase_admin._apps:
+            service_account_key = json.loads(os.environ.get("FIREBASE_SERVICE_ACCOUNT_PATH"))
+            cred = credentials.Certificate(service_account_key)
+            firebase_admin.initialize_app(cred)
+        client = firestore.client()
+        logger.info("Firebase initialized successfully.")
+        return client
+    except Exception as e:
+        logger.error(f"Error initializing Firebase: {e}")
+        raise
+
+def _init_gemini():
+    import google.generativeai as genai
+    
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+def get_db():
+    """Firestore client, initialized on first use"""
+    return _get_client('firestore', _init_firestore)
+
+def get_model():
+    """Gemini model, configured on first use"""
+    return _get_client('gemini', _init_gemini)
+
+def get_gemini():
+    """Async Gemini client (concurrency cap, timeouts) over get_model()"""
+    return _get_client('gemini_async', lambda: gemini_client.AsyncGemini(
+        get_model(),
+        max_concurrency=GEMINI_MAX_CONCURRENCY,
+        timeout=GEMINI_TIMEOUT_SECONDS,
+        breaker=circuit_breaker.CircuitBreaker(
+            'gemini', GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET_SECONDS
+        ),
+    ))
+
+def get_repository():
+    """News/category repository for STORAGE_BACKEND, created on first use"""
+    return _get_client('repository', lambda: storage.create_repository(
+        STORAGE_BACKEND, get_db() if STORAGE_BACKEND == 'firestore' else None
+    ))
+
+def _init_category_deleter():
+    deleter = deletion.CategoryDeleter(
+        get_repository(),
+        chunk_size=int(os.environ.get('DELETE_CHUNK_SIZE', 500)),
+        parallelism=int(os.environ.get('DELETE_PARALLELISM', 4)),
+    )
+    # Pick up deletions a previous (crashed or redeployed) process left unfinished
+    deleter.schedule_resume()
+    return deleter
+
+def get_category_deleter():
+    """Background category deleter, created (and resuming old jobs) on first use"""
+    return _get_client('category_deleter', _init_category_deleter)
+
+def parse_html(html):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser')
 
 # --- Step 1: Use Gemini for Smart Keyword Generation ---
-async def get_smart_keywords_with_gemini(user_prompt):
+@timed_stage('keywords')
+async def get_smart_keywords_with_gemini(user_prompt, refresh=False, deadline=None):
     """
     Use Gemini to generate intelligent search keywords for REAL news APIs
+
+    Results are cached per canonical topic of the prompt, so similar prompts
+    share keywords (and through them fetched sources); `refresh` skips the
+    lookup (prewarming). With a `deadline` the Gemini call is abandoned when
+    it runs out and the fallback keywords are used.
     """
+    cache_key = canonical_prompts.canonicalize(user_prompt)
+    if not refresh:
+        cached = keyword_cache.get(cache_key)
+        if cached:
+            return cached
+    
     keyword_prompt = f"""
     You are a news search expert. Generate 6-8 precise search keywords that will help find REAL, current news articles about: "{user_prompt}"
 
@@ -85,22 +235,122 @@ async def get_smart_keywords_with_gemini(user_prompt):
     """
     
     try:
-        response = model.generate_content(
+        generation = get_gemini().generate(
             keyword_prompt,
-            generation_config=genai.GenerationConfig(
-                temperature=0.2,
-                max_output_tokens=200,
-                response_mime_type="application/json"
-            )
+            temperature=0.2,
+            max_output_tokens=200,
+            response_mime_type="application/json"
         )
-        keywords = json.loads(response.text)
+        if deadline is not None:
+            # Leave at least half of the request's budget for the pipeline itself
+            generation = Deadline(deadline.remaining() / 2).wait('keywords', generation)
+        response_text = await generation
+        keywords = json.loads(response_text)
         logger.info(f"Generated keywords: {keywords}")
+        keyword_cache.set(cache_key, keywords[:8])
         return keywords[:8]
+    except DeadlineExceeded:
+        logger.warning(f"⏱️ Deadline reached generating keywords for '{user_prompt}', using fallback keywords")
+        return [user_prompt, f"{user_prompt} news"]
     except Exception as e:
         logger.error(f"Keyword generation failed: {e}")
         return [user_prompt, f"{user_prompt} news"]
 
 # --- Step 2: Advanced Google News URL Decoding ---
+# Google News article IDs ("CBMi...", "CAIi...") are URL-safe base64 of a small
+# protobuf message. The publisher URL sits in a length-delimited field, usually
+# field 4 right after a varint field 1 (0x08 0x13 0x22 -> "CBMi"), optionally
+# followed by an AMP URL (field 26) and other trailing fields. Newer IDs whose
+# payload starts with "AU_yqL" are opaque and can only be resolved online.
+GOOGLE_NEWS_OPAQUE_PREFIX = b'AU_yqL'
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while pos < len(data):
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            break
+    raise ValueError("Malformed varint")
+
+def _iter_protobuf_fields(data):
+    """Yield (field_number, wire_type, value) for the top-level fields of a protobuf message"""
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        field_number, wire_type = key >> 3, key & 0x07
+        if wire_type == 0:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+        elif wire_type == 2:
+            length, pos = _read_varint(data, pos)
+            if pos + length > len(data):
+                raise ValueError("Truncated length-delimited field")
+            value, pos = data[pos:pos + length], pos + length
+        elif wire_type == 5:
+            value, pos = data[pos:pos + 4], pos + 4
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type}")
+        yield field_number, wire_type, value
+
+def _b64decode_article_id(article_id):
+    padded = article_id + '=' * (-len(article_id) % 4)
+    return base64.urlsafe_b64decode(padded)
+
+def decode_google_news_article_id(article_id):
+    """
+    Decode a Google News article ID to the publisher URL offline.
+
+    Returns None when the ID is not a protobuf envelope or only carries an
+    opaque token (those need resolve_google_news_with_session).
+    """
+    try:
+        data = _b64decode_article_id(article_id)
+    except (ValueError, TypeError):
+        return None
+    
+    urls = []
+    try:
+        for _, wire_type, value in _iter_protobuf_fields(data):
+            if wire_type != 2:
+                continue
+            if value.startswith(GOOGLE_NEWS_OPAQUE_PREFIX):
+                return None
+            if value.startswith((b'http://', b'https://')):
+                try:
+                    urls.append(value.decode('utf-8'))
+                except UnicodeDecodeError:
+                    continue
+    except ValueError:
+        return None
+    
+    # The first URL is the canonical article; later ones are AMP variants
+    for url in urls:
+        if 'google.com' not in urlparse(url).netloc:
+            return url
+    return None
+
+def google_news_article_id(url):
+    if not url or '/articles/' not in url:
+        return None
+    return url.split('/articles/')[-1].split('?')[0]
+
+def decode_google_news_urls(urls):
+    """Batch-decode Google News links offline; returns {link: publisher URL or None}"""
+    decoded = {}
+    for url in urls:
+        if url in decoded:
+            continue
+        article_id = google_news_article_id(url)
+        decoded[url] = decode_google_news_article_id(article_id) if article_id else None
+    return decoded
+
 def decode_google_news_url_advanced(encoded_url):
     """
     Advanced Google News URL decoding with multiple methods
@@ -110,7 +360,14 @@ def decode_google_news_url_advanced(encoded_url):
         
         # Method 1: Extract article ID and try different decoding approaches
         if '/articles/' in encoded_url:
-            article_id = encoded_url.split('/articles/')[-1].split('?')[0]
+            article_id = google_news_article_id(encoded_url)
+            
+            # Protobuf envelope (covers most CBMi.../CAIi... IDs)
+            protobuf_url = decode_google_news_article_id(article_id)
+            if protobuf_url:
+                record_google_news_decode('protobuf')
+                logger.info(f"✅ Protobuf decoded URL: {protobuf_url}")
+                return protobuf_url
             
             # Try URL decoding first
             try:
@@ -122,6 +379,7 @@ def decode_google_news_url_advanced(encoded_url):
                 urls = re.findall(url_pattern, url_decoded)
                 for url in urls:
                     if 'google.com' not in url and len(url) > 20:
+                        record_google_news_decode('legacy')
                         logger.info(f"✅ Found URL in decoded string: {url}")
                         return url
             except Exception as e:
@@ -139,6 +397,7 @@ def decode_google_news_url_advanced(encoded_url):
                     urls = re.findall(url_pattern, decoded_str)
                     for url in urls:
                         if 'google.com' not in url and len(url) > 20:
+                            record_google_news_decode('legacy')
                             logger.info(f"✅ Base64 decoded URL: {url}")
                             return url
                             
@@ -150,10 +409,11 @@ def decode_google_news_url_advanced(encoded_url):
         logger.error(f"Advanced URL decoding failed: {e}")
         return None
 
-async def resolve_google_news_with_session(google_news_url):
+async def resolve_google_news_with_session(google_news_url, deadline=None):
     """
     Use requests session with enhanced headers to resolve Google News URLs
     """
+    deadline = deadline or Deadline(IMAGE_DEADLINE_SECONDS)
     try:
         # Enhanced headers to mimic real browser
         headers = {
@@ -176,8 +436,12 @@ async def resolve_google_news_with_session(google_news_url):
         session = requests.Session()
         session.headers.update(headers)
         
-        # Make request with longer timeout
-        response = session.get(google_news_url, allow_redirects=True, timeout=15)
+        # Make request with longer timeout (capped by the remaining budget)
+        deadline.check('google_news_resolve')
+        with track_upstream('google_news_resolve'):
+            response = await deadline.run_blocking(
+                'google_news_resolve', session.get, google_news_url, allow_redirects=True, timeout=15
+            )
         
         # Check if we got redirected to actual news site
         if 'news.google.com' not in response.url and response.url != google_news_url:
@@ -186,7 +450,7 @@ async def resolve_google_news_with_session(google_news_url):
         
         # Parse the Google News page for original article links
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = parse_html(response.text)
             
             # Look for various link patterns in the page
             link_selectors = [
@@ -209,6 +473,8 @@ async def resolve_google_news_with_session(google_news_url):
                     continue
         
         return None
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.error(f"Session-based resolution failed: {e}")
         return None
@@ -238,8 +504,9 @@ async def fetch_real_news_with_newsapi(keywords):
             'pageSize': 20
         }
         
-        response = requests.get(newsapi_url, params=params, timeout=15)
-        response.raise_for_status()
+        with track_upstream('newsapi'):
+            response = await asyncio.to_thread(requests.get, newsapi_url, params=params, timeout=15)
+            response.raise_for_status()
         data = response.json()
         
         real_articles = []
@@ -265,22 +532,37 @@ async def fetch_real_news_with_newsapi(keywords):
         return []
 
 # --- Step 4: Enhanced Real Image Extraction ---
-async def extract_real_image_aggressive(url, title):
+# Total wall-clock budget for resolving one article's image (HEAD, Google News
+# resolution, page fetch, Pexels); when it runs out the chain goes straight
+# to the contextual placeholder.
+IMAGE_DEADLINE_SECONDS = float(os.environ.get('IMAGE_DEADLINE_SECONDS', 10))
+
+# Candidate images per article page whose headers are probed for their size
+IMAGE_PROBE_MAX_CANDIDATES = int(os.environ.get('IMAGE_PROBE_MAX_CANDIDATES', 4))
+IMAGE_PROBE_TIMEOUT_SECONDS = 3
+
+async def extract_real_image_aggressive(url, title, deadline=None):
     """
     Aggressively extract real images with multiple resolution methods
     """
+    deadline = deadline or Deadline(IMAGE_DEADLINE_SECONDS)
     try:
         # Try advanced URL decoding first
         decoded_url = decode_google_news_url_advanced(url)
         if decoded_url:
             actual_url = decoded_url
-        else:
-            # Try session-based resolution
-            session_resolved = await resolve_google_news_with_session(url)
+        elif 'news.google.com' in url:
+            # Try session-based resolution (network fallback for opaque IDs)
+            record_google_news_decode('network')
+            session_resolved = await resolve_google_news_with_session(url, deadline)
             if session_resolved:
                 actual_url = session_resolved
             else:
+                record_google_news_decode('failed')
                 actual_url = url
+        else:
+            # Already a publisher URL (NewsAPI/NewsData)
+            actual_url = url
         
         # Skip if still on Google News
         if 'news.google.com' in actual_url:
@@ -299,36 +581,66 @@ async def extract_real_image_aggressive(url, title):
             'Referer': 'https://news.google.com/'
         }
         
-        response = requests.get(actual_url, headers=headers, timeout=20, allow_redirects=True)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Priority 1: OpenGraph image
-        og_image = soup.find('meta', property='og:image')
-        if og_image and og_image.get('content'):
-            image_url = og_image['content']
-            if is_real_news_image(image_url):
-                absolute_url = urljoin(response.url, image_url)
-                logger.info(f"✅ Found OG image: {absolute_url}")
-                return absolute_url
-        
-        # Priority 2: Twitter card image
-        twitter_image = soup.find('meta', attrs={'name': 'twitter:image'})
-        if twitter_image and twitter_image.get('content'):
-            image_url = twitter_image['content']
-            if is_real_news_image(image_url):
-                absolute_url = urljoin(response.url, image_url)
-                logger.info(f"✅ Found Twitter image: {absolute_url}")
-                return absolute_url
+        # An unchanged page (304) reuses the candidates found last time
+        candidates = await deadline.run_blocking(
+            'article_page', http_cache.conditional_get, http_validators, 'article_page', actual_url,
+            lambda response: extract_image_candidates(response.text, response.url),
+            headers=headers, timeout=20, allow_redirects=True
+        )
+        image_url = await pick_best_image(candidates, deadline)
+        if image_url:
+            return image_url
         
         logger.warning(f"⚠️ No real images found in resolved article")
         return None
         
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.error(f"❌ Aggressive image extraction failed: {e}")
         return None
 
+async def pick_best_image(candidates, deadline):
+    """Probe candidate images concurrently (first few KB only) and return the best-sized one"""
+    if not candidates:
+        return None
+    results = await asyncio.gather(*(
+        deadline.run_blocking('image_probe', image_probe.probe_image, url, timeout=IMAGE_PROBE_TIMEOUT_SECONDS)
+        for url in candidates
+    ), return_exceptions=True)
+    ranked = image_probe.rank_candidates(candidates, results)
+    if not ranked:
+        logger.warning(f"⚠️ None of {len(candidates)} candidate images is usable")
+        return None
+    logger.info(f"✅ Picked image {candidates.index(ranked[0]) + 1}/{len(candidates)} by probed size: {ranked[0]}")
+    return ranked[0]
+
+def extract_image_candidates(html, base_url, limit=IMAGE_PROBE_MAX_CANDIDATES):
+    """
+    Candidate images of an article page in priority order: OpenGraph, Twitter
+    card, image_src link, then images inside the article body
+    """
+    soup = parse_html(html)
+    sources = []
+    
+    for attrs in ({'property': 'og:image'}, {'property': 'og:image:secure_url'},
+                  {'name': 'twitter:image'}, {'name': 'twitter:image:src'}):
+        sources.extend(tag.get('content') for tag in soup.find_all('meta', attrs=attrs))
+    sources.extend(tag.get('href') for tag in soup.find_all('link', rel='image_src'))
+    body = soup.find('article') or soup.find('main')
+    if body:
+        sources.extend(img.get('src') or img.get('data-src') for img in body.find_all('img'))
+    
+    candidates = []
+    for source in sources:
+        if source and is_real_news_image(source):
+            absolute_url = urljoin(base_url, source)
+            if absolute_url not in candidates:
+                candidates.append(absolute_url)
+                if len(candidates) >= limit:
+                    break
+    return candidates
+
 def is_real_news_image(url):
     """Enhanced validation for real news images"""
     if not url or len(url) < 10:
@@ -369,10 +681,11 @@ def is_real_news_image(url):
     return has_image_indicator or has_news_indicator
 
 # --- Step 5: Pexels API (Fallback Only) ---
-async def get_relevant_image_from_pexels(title, description=""):
+async def get_relevant_image_from_pexels(title, description="", deadline=None):
     """
     Get contextually relevant images from Pexels API (fallback only)
     """
+    deadline = deadline or Deadline(IMAGE_DEADLINE_SECONDS)
     try:
         # Extract key terms for search
         text = f"{title} {description}".lower()
@@ -415,7 +728,13 @@ async def get_relevant_image_from_pexels(title, description=""):
                     'Authorization': pexels_api_key
                 }
                 
-                response = requests.get(pexels_url, headers=headers, params=params, timeout=10)
+                deadline.check('pexels')
+                with track_upstream('pexels') as call:
+                    response = await deadline.run_blocking(
+                        'pexels', requests.get, pexels_url, headers=headers, params=params, timeout=10
+                    )
+                    if response.status_code != 200:
+                        call.outcome = 'http_error'
                 if response.status_code == 200:
                     data = response.json()
                     photos = data.get('photos', [])
@@ -428,11 +747,15 @@ async def get_relevant_image_from_pexels(title, description=""):
                         
                         logger.info(f"✅ Found Pexels image for '{search_term}': {image_url}")
                         return image_url
+            except DeadlineExceeded:
+                raise
             except Exception as e:
                 logger.debug(f"Pexels search failed for '{search_term}': {e}")
                 continue
         
         return None
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.error(f"Pexels API failed: {e}")
         return None
@@ -463,56 +786,96 @@ def get_contextual_placeholder_image(title, description=""):
         return "https://images.unsplash.com/photo-1504711434969-e33886168f5c?w=800&h=450&fit=crop&q=80"
 
 # --- Step 6: Real Image Priority Strategy ---
-async def get_real_image_priority(article):
+@timed_stage('image')
+async def get_real_image_priority(article, deadline=None):
     """
     Prioritize real images from actual news sources over stock images
+
+    Resolved images are cached per article URL; placeholders are not, so an
+    article that ran out of budget is retried next time.
+    """
+    cache_key = article.get('url') or article.get('title')
+    if not cache_key:
+        return await resolve_real_image(article, deadline)
+    cached = image_cache.get(cache_key)
+    if cached:
+        return cached
+    
+    async def resolve():
+        image_result = await resolve_real_image(article, deadline)
+        if image_result['source'] != 'placeholder':
+            image_cache.set(cache_key, image_result)
+        return image_result
+    
+    return await image_flights.do(cache_key, resolve)
+
+async def resolve_real_image(article, deadline=None):
+    """
+    Real source image, else an extracted page image, else Pexels, else a placeholder
+
+    Every network step draws from one `deadline` (IMAGE_DEADLINE_SECONDS by
+    default); once it is spent the remaining strategies are skipped.
     """
     title = article.get('title', '')
     url = article.get('url', '')
     existing_image = article.get('urlToImage')
+    deadline = deadline or Deadline(IMAGE_DEADLINE_SECONDS)
     
     logger.info(f"🎯 REAL IMAGE PRIORITY for: {title[:50]}...")
     
-    # Strategy 1: Use NewsData.io/NewsAPI real image
-    if existing_image and is_real_news_image(existing_image):
-        try:
-            response = requests.head(existing_image, timeout=5)
-            if response.status_code == 200:
-                logger.info(f"✅ Using real source image")
-                return {
-                    'imageUrl': existing_image,
-                    'source': 'source-real',
-                    'relevance': 'high'
-                }
-        except:
-            pass
-    
-    # Strategy 2: Aggressive extraction from resolved source
-    if url:
+    try:
+        # Strategy 1: Use NewsData.io/NewsAPI real image
+        if existing_image and is_real_news_image(existing_image):
+            try:
+                deadline.check('image_head')
+                with track_upstream('image_head') as call:
+                    response = await deadline.run_blocking('image_head', requests.head, existing_image, timeout=5)
+                    if response.status_code != 200:
+                        call.outcome = 'http_error'
+                if response.status_code == 200:
+                    logger.info(f"✅ Using real source image")
+                    return {
+                        'imageUrl': existing_image,
+                        'source': 'source-real',
+                        'relevance': 'high'
+                    }
+            except DeadlineExceeded:
+                raise
+            except:
+                pass
+        
+        # Strategy 2: Aggressive extraction from resolved source
+        if url:
+            try:
+                real_image = await extract_real_image_aggressive(url, title, deadline)
+                if real_image:
+                    logger.info(f"✅ Extracted real image from source")
+                    return {
+                        'imageUrl': real_image,
+                        'source': 'extracted-real',
+                        'relevance': 'high'
+                    }
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                logger.error(f"Real extraction failed: {e}")
+        
+        # Strategy 3: Only use Pexels as last resort
+        logger.warning(f"⚠️ No real images found, falling back to Pexels")
         try:
-            real_image = await extract_real_image_aggressive(url, title)
-            if real_image:
-                logger.info(f"✅ Extracted real image from source")
+            pexels_image = await get_relevant_image_from_pexels(title, article.get('description', ''), deadline)
+            if pexels_image:
                 return {
-                    'imageUrl': real_image,
-                    'source': 'extracted-real',
-                    'relevance': 'high'
+                    'imageUrl': pexels_image,
+                    'source': 'pexels-fallback',
+                    'relevance': 'low'
                 }
+        except DeadlineExceeded:
+            raise
         except Exception as e:
-            logger.error(f"Real extraction failed: {e}")
-    
-    # Strategy 3: Only use Pexels as last resort
-    logger.warning(f"⚠️ No real images found, falling back to Pexels")
-    try:
-        pexels_image = await get_relevant_image_from_pexels(title, article.get('description', ''))
-        if pexels_image:
-            return {
-                'imageUrl': pexels_image,
-                'source': 'pexels-fallback',
-                'relevance': 'low'
-            }
-    except Exception as e:
-        logger.error(f"Pexels fallback failed: {e}")
+            logger.error(f"Pexels fallback failed: {e}")
+    except DeadlineExceeded as e:
+        logger.warning(f"⏱️ Image budget ({deadline.seconds:g}s) spent in '{e.stage}', using placeholder")
     
     # Strategy 4: Contextual placeholder (absolute last resort)
     return {
@@ -521,67 +884,365 @@ async def get_real_image_priority(article):
         'relevance': 'low'
     }
 
+# --- Image Proxy ---
+# With IMAGE_PROXY on, stored items point at signed /img/<signature>/<url>
+# proxy URLs instead of the source image; the proxy serves cached fixed-width
+# WebP/JPEG thumbnails.
+IMAGE_PROXY = os.environ.get('IMAGE_PROXY', 'False').lower() == 'true'
+IMAGE_PROXY_BASE_URL = os.environ.get('IMAGE_PROXY_BASE_URL', '').rstrip('/')
+# Shared by every instance so proxy URLs stay valid anywhere and across redeploys
+IMAGE_PROXY_SECRET = os.environ.get('IMAGE_PROXY_SECRET', '')
+IMAGE_PROXY_CACHE_SECONDS = 365 * 24 * 3600
+
+if IMAGE_PROXY and not IMAGE_PROXY_SECRET:
+    logger.warning("⚠️ IMAGE_PROXY is on but IMAGE_PROXY_SECRET is not set; storing source image URLs")
+
+thumbnail_cache = image_proxy.ThumbnailCache(
+    os.environ.get('IMAGE_PROXY_DIR', 'image_cache'),
+    widths=[int(w) for w in os.environ.get('IMAGE_PROXY_WIDTHS', '320,640').split(',')],
+)
+
+def proxied_image_url(url):
+    """imageUrl to store for a source image: its signed /img proxy URL when IMAGE_PROXY is on"""
+    if not IMAGE_PROXY or not IMAGE_PROXY_SECRET or not url or not url.startswith(('http://', 'https://')):
+        return url
+    return f"{IMAGE_PROXY_BASE_URL}/img/{image_proxy.signed_path(url, IMAGE_PROXY_SECRET)}"
+
+@api.route('/img/<signature>/<encoded_url>', methods=['GET'])
+def proxy_image(signature, encoded_url):
+    try:
+        url = image_proxy.verify_signed_path(signature, encoded_url, IMAGE_PROXY_SECRET)
+    except image_proxy.ImageProxyError:
+        return jsonify({"error": "Image not found"}), 404
+
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+    if fmt not in image_proxy.FORMATS:
+        return jsonify({"error": f"format must be one of {sorted(image_proxy.FORMATS)}"}), 400
+    width = request.args.get('w', type=int) or thumbnail_cache.widths[-1]
+
+    try:
+        path = thumbnail_cache.thumbnail(url, width, fmt)
+    except (image_proxy.ImageProxyError, requests.RequestException, OSError) as e:
+        # A dead source should not break the card; serve the generic placeholder
+        logger.warning(f"⚠️ Image proxy falling back to placeholder for {url}: {e}")
+        response = redirect(get_contextual_placeholder_image(''))
+        response.headers['Cache-Control'] = 'public, max-age=300'
+        return response
+
+    response = send_file(path, mimetype=image_proxy.FORMATS[fmt], conditional=True, etag=True)
+    response.headers['Cache-Control'] = f'public, max-age={IMAGE_PROXY_CACHE_SECONDS}, immutable'
+    if 'format' not in request.args:
+        response.vary.add('Accept')
+    return response
+
 # --- Step 7: RSS Parsing Functions ---
-def parse_google_news_rss(rss_content):
+GOOGLE_RSS_MAX_ARTICLES = 10
+RSS_CHUNK_SIZE = 8192
+# Fan-out mode: one RSS query per keyword, run concurrently under a shared deadline
+GOOGLE_RSS_FANOUT = os.environ.get('GOOGLE_RSS_FANOUT', 'False').lower() == 'true'
+GOOGLE_RSS_FANOUT_DEADLINE_SECONDS = float(os.environ.get('GOOGLE_RSS_FANOUT_DEADLINE_SECONDS', 8))
+GOOGLE_RSS_FANOUT_MAX_ARTICLES = int(os.environ.get('GOOGLE_RSS_FANOUT_MAX_ARTICLES', 20))
+# Fan-out fetch threads per worker, counting ones abandoned at a deadline that
+# are still finishing (a cancelled to_thread call cannot stop its thread)
+GOOGLE_RSS_FANOUT_MAX_THREADS = int(os.environ.get('GOOGLE_RSS_FANOUT_MAX_THREADS', 8))
+_fanout_threads = threading.BoundedSemaphore(GOOGLE_RSS_FANOUT_MAX_THREADS)
+GOOGLE_RSS_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+def _rss_item_to_article(item):
+    title_elem = item.find('title')
+    description_elem = item.find('description')
+    link_elem = item.find('link')
+    pub_date_elem = item.find('pubDate')
+    source_elem = item.find('source')
+    
+    if title_elem is None or description_elem is None:
+        return None
+    
+    title = title_elem.text
+    description = description_elem.text
+    link = link_elem.text if link_elem is not None else ""
+    pub_date = pub_date_elem.text if pub_date_elem is not None else ""
+    source_name = source_elem.text if source_elem is not None else "Google News"
+    
+    return {
+        'title': title,
+        'description': description,
+        'url': link,
+        'publishedAt': pub_date,
+        'source': {'name': source_name},
+        'content': description,
+        'isReal': True
+    }
+
+def iter_google_news_rss(chunks, limit=None):
+    """
+    Incrementally parse Google News RSS from an iterable of byte chunks.
+
+    Articles are yielded as soon as their <item> closes and parsed items are
+    dropped from the tree, so memory stays flat however long the feed is.
+    Stops consuming chunks once `limit` articles have been yielded.
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    channel = None
+    yielded = 0
+    
+    def drain():
+        nonlocal channel
+        for event, elem in parser.read_events():
+            if event == 'start':
+                if elem.tag == 'channel':
+                    channel = elem
+                continue
+            if elem.tag != 'item':
+                continue
+            article = _rss_item_to_article(elem)
+            elem.clear()
+            if channel is not None:
+                channel.remove(elem)
+            if article:
+                yield article
+    
+    for chunk in chunks:
+        parser.feed(chunk)
+        for article in drain():
+            yield article
+            yielded += 1
+            if limit is not None and yielded >= limit:
+                return
+    parser.close()
+    for article in drain():
+        yield article
+        yielded += 1
+        if limit is not None and yielded >= limit:
+            return
+
+def parse_google_news_rss(rss_content, limit=None):
     """Parse Google News RSS content"""
+    articles = []
     try:
-        root = ET.fromstring(rss_content)
-        articles = []
-        
-        for item in root.findall('.//item'):
-            title_elem = item.find('title')
-            description_elem = item.find('description')
-            link_elem = item.find('link')
-            pub_date_elem = item.find('pubDate')
-            source_elem = item.find('source')
-            
-            if title_elem is not None and description_elem is not None:
-                title = title_elem.text
-                description = description_elem.text
-                link = link_elem.text if link_elem is not None else ""
-                pub_date = pub_date_elem.text if pub_date_elem is not None else ""
-                source_name = source_elem.text if source_elem is not None else "Google News"
-                
-                articles.append({
-                    'title': title,
-                    'description': description,
-                    'url': link,
-                    'publishedAt': pub_date,
-                    'source': {'name': source_name},
-                    'content': description,
-                    'isReal': True
-                })
-        
+        for article in iter_google_news_rss([rss_content], limit):
+            articles.append(article)
         return articles
     except ET.ParseError as e:
         logger.error(f"RSS parsing failed: {e}")
         return []
 
+def google_rss_search_url(query):
+    return f"https://news.google.com/rss/search?q={quote(query)}&hl=en-US&gl=US&ceid=US:en"
+
+def _fetch_google_rss_articles(rss_url, headers, limit, timeout=10):
+    """
+    Stream the feed and stop downloading once `limit` articles are parsed.
+    Unchanged feeds (304) reuse the previous parse without any body transfer.
+    """
+    def parse(response):
+        articles = []
+        try:
+            for article in iter_google_news_rss(response.iter_content(RSS_CHUNK_SIZE), limit):
+                articles.append(article)
+        except ET.ParseError as e:
+            logger.error(f"RSS parsing failed: {e}")
+        return articles
+    
+    # The response is closed after parsing, so stopping early drops the
+    # connection instead of reading the rest of the feed.
+    return http_cache.conditional_get(
+        http_validators, 'google_rss', rss_url, parse, cache_key=f"{rss_url}#limit={limit}",
+        headers=headers, timeout=timeout, stream=True
+    )
+
+def _article_merge_key(article):
+    url = (article.get('url') or '').split('?')[0]
+    return url or (article.get('title') or '').strip().lower()
+
+def merge_ranked_articles(result_lists, limit=None):
+    """
+    Merge per-query result lists, dropping duplicates.
+
+    Articles returned by more queries rank first; ties keep the best position
+    any query gave them, then first-seen order. Each merged article records
+    how many queries returned it under 'keywordHits'.
+    """
+    merged = {}
+    for results in result_lists:
+        seen_in_list = set()
+        for position, article in enumerate(results):
+            key = _article_merge_key(article)
+            if not key or key in seen_in_list:
+                continue
+            seen_in_list.add(key)
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = {'article': article, 'hits': 1, 'best': position, 'order': len(merged)}
+            else:
+                entry['hits'] += 1
+                entry['best'] = min(entry['best'], position)
+    
+    ranked = sorted(merged.values(), key=lambda e: (-e['hits'], e['best'], e['order']))
+    if limit is not None:
+        ranked = ranked[:limit]
+    articles = []
+    for entry in ranked:
+        article = dict(entry['article'])
+        article['keywordHits'] = entry['hits']
+        articles.append(article)
+    return articles
+
+def _fanout_slot():
+    """
+    Claim for one taken _fanout_threads slot: the first of the query thread
+    and the cancellation callback to call it gives the slot back
+    """
+    claims = [True]
+
+    def claim():
+        try:
+            return claims.pop()
+        except IndexError:
+            return False
+    return claim
+
+def _fetch_google_rss_keyword(keyword, timeout, claim):
+    """One fan-out query; runs in a thread and gives back its _fanout_threads slot"""
+    if not claim():
+        # Abandoned before the thread started; the slot was already given back
+        return []
+    try:
+        return _fetch_google_rss_articles(
+            google_rss_search_url(keyword), GOOGLE_RSS_HEADERS, GOOGLE_RSS_MAX_ARTICLES, timeout
+        )
+    finally:
+        _fanout_threads.release()
+
+async def fetch_real_news_google_rss_fanout(keywords):
+    """
+    Run one Google News RSS query per keyword concurrently, keep whatever has
+    arrived by the shared deadline, and merge/rank the results.
+
+    Queries only start while a fan-out thread is free. Queries still running
+    at the deadline are left to finish in their thread (bounded by their own
+    timeout) and keep their slot until they do, so abandoned fetches can
+    never pile up threads; queries whose thread had not started yet give
+    their slot back when cancelled.
+    """
+    deadline = Deadline(GOOGLE_RSS_FANOUT_DEADLINE_SECONDS)
+    queued = list(enumerate(keywords))
+    running = {}
+    results = {}
+    while (queued or running) and not deadline.expired:
+        while queued and _fanout_threads.acquire(blocking=False):
+            index, keyword = queued.pop(0)
+            claim = _fanout_slot()
+            task = asyncio.create_task(
+                asyncio.to_thread(_fetch_google_rss_keyword, keyword, deadline.remaining(), claim)
+            )
+            task.add_done_callback(lambda task, claim=claim: task.cancelled() and claim() and _fanout_threads.release())
+            running[task] = index
+        if not running:
+            # Every slot is held by queries abandoned earlier; wait for one to finish
+            await asyncio.sleep(0.05)
+            continue
+        done, _ = await asyncio.wait(running, timeout=deadline.remaining(), return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            index = running.pop(task)
+            if task.exception():
+                logger.error(f"Google News keyword query failed: {task.exception()}")
+            else:
+                results[index] = task.result()
+    for task in running:
+        task.cancel()
+    
+    logger.info(f"Google News fan-out: {len(results)}/{len(keywords)} keyword queries answered before the deadline")
+    return merge_ranked_articles([results[index] for index in sorted(results)], GOOGLE_RSS_FANOUT_MAX_ARTICLES)
+
 async def fetch_real_news_google_rss(keywords):
     """Fetch REAL news from Google News RSS"""
     try:
-        search_query = quote(" ".join(keywords[:3]))
-        rss_url = f"https://news.google.com/rss/search?q={search_query}&hl=en-US&gl=US&ceid=US:en"
+        if GOOGLE_RSS_FANOUT and len(keywords) > 1:
+            real_articles = await fetch_real_news_google_rss_fanout(keywords)
+            logger.info(f"Google News found {len(real_articles)} articles")
+            return real_articles
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        response = requests.get(rss_url, headers=headers, timeout=10)
-        response.raise_for_status()
+        rss_url = google_rss_search_url(" ".join(keywords[:3]))
         
-        real_articles = parse_google_news_rss(response.content)
+        real_articles = await asyncio.to_thread(
+            _fetch_google_rss_articles, rss_url, GOOGLE_RSS_HEADERS, GOOGLE_RSS_MAX_ARTICLES
+        )
         logger.info(f"Google News found {len(real_articles)} articles")
-        return real_articles[:10]
+        return real_articles
         
     except Exception as e:
         logger.error(f"Google News failed: {e}")
         return []
 
+NEWSDATA_URL = "https://newsdata.io/api/1/latest"
+NEWSDATA_PAGE_SIZE = 10
+# Articles to collect per query; above NEWSDATA_PAGE_SIZE the adapter follows nextPage
+NEWSDATA_MAX_ARTICLES = int(os.environ.get('NEWSDATA_MAX_ARTICLES', NEWSDATA_PAGE_SIZE))
+# Wall-clock budget for all pages of one NewsData.io fetch
+NEWSDATA_TIMEOUT_SECONDS = 15
+
+def _fetch_newsdata_query(api_key, query, budget, deadline):
+    """
+    Fetch one NewsData.io query, following nextPage until `budget` articles
+    are collected or `deadline` runs out. A later page failing keeps the
+    pages already collected.
+    """
+    real_articles = []
+    page = None
+    
+    while len(real_articles) < budget:
+        params = {
+            'apikey': api_key,
+            'language': 'en',
+            'size': NEWSDATA_PAGE_SIZE,
+            'q': query
+        }
+        if page:
+            params['page'] = page
+        
+        try:
+            timeout = deadline.timeout('newsdata', NEWSDATA_TIMEOUT_SECONDS)
+            with track_upstream('newsdata'):
+                response = requests.get(NEWSDATA_URL, params=params, timeout=timeout)
+                response.raise_for_status()
+            data = response.json()
+        except (DeadlineExceeded, requests.RequestException, ValueError) as e:
+            if page is None:
+                raise
+            logger.warning(f"NewsData.io stopped paging '{query}' after {len(real_articles)} articles: {e}")
+            break
+        
+        if data.get('status') != 'success' or not data.get('results'):
+            break
+        
+        for item in data['results']:
+            if item.get('title') and item.get('description'):
+                real_articles.append({
+                    'title': item.get('title'),
+                    'description': item.get('description'),
+                    'url': item.get('link'),
+                    'urlToImage': item.get('image_url'),
+                    'publishedAt': item.get('pubDate'),
+                    'source': {'name': item.get('source_id', 'NewsData')},
+                    'content': item.get('content', item.get('description')),
+                    'isReal': True,
+                    'hasRealImage': bool(item.get('image_url'))
+                })
+        
+        page = data.get('nextPage')
+        if not page:
+            break
+    
+    return real_articles[:budget]
+
 async def fetch_real_news_newsdata(keywords):
     """Fetch REAL news from NewsData.io"""
     try:
-        newsdata_url = "https://newsdata.io/api/1/latest"
         api_key = os.environ.get("NEWSDATA_API_KEY")
         
         if not api_key:
@@ -592,39 +1253,24 @@ async def fetch_real_news_newsdata(keywords):
             keywords[0] if keywords else "",
             " OR ".join(keywords[:3])
         ]
+        search_queries = [query for i, query in enumerate(search_queries) if query and query not in search_queries[:i]]
+        
+        # Both queries run at once under one budget; one failing doesn't
+        # discard the other's results
+        deadline = Deadline(NEWSDATA_TIMEOUT_SECONDS)
+        results = await asyncio.gather(*[
+            asyncio.to_thread(_fetch_newsdata_query, api_key, query, NEWSDATA_MAX_ARTICLES, deadline)
+            for query in search_queries
+        ], return_exceptions=True)
+        
+        result_lists = []
+        for query, result in zip(search_queries, results):
+            if isinstance(result, Exception):
+                logger.error(f"NewsData.io query '{query}' failed: {result}")
+            else:
+                result_lists.append(result)
         
-        real_articles = []
-        
-        for query in search_queries:
-            if not query:
-                continue
-                
-            params = {
-                'apikey': api_key,
-                'language': 'en',
-                'size': 10,
-                'q': query
-            }
-            
-            response = requests.get(newsdata_url, params=params, timeout=15)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data.get('status') == 'success' and data.get('results'):
-                for item in data['results']:
-                    if item.get('title') and item.get('description'):
-                        real_articles.append({
-                            'title': item.get('title'),
-                            'description': item.get('description'),
-                            'url': item.get('link'),
-                            'urlToImage': item.get('image_url'),
-                            'publishedAt': item.get('pubDate'),
-                            'source': {'name': item.get('source_id', 'NewsData')},
-                            'content': item.get('content', item.get('description')),
-                            'isReal': True,
-                            'hasRealImage': bool(item.get('image_url'))
-                        })
-        
+        real_articles = merge_ranked_articles(result_lists)
         logger.info(f"NewsData.io found {len(real_articles)} REAL articles")
         return real_articles
     except Exception as e:
@@ -632,8 +1278,39 @@ async def fetch_real_news_newsdata(keywords):
         return []
 
 # --- Step 8: Article Enhancement and Filtering ---
+# Descriptions with at least ENHANCE_SKIP_MIN_WORDS words that the source did
+# not cut off are kept as they are. When more than ENHANCE_MAX_GEMINI_QUEUE
+# Gemini calls are already waiting, or Gemini's circuit is open, summaries are
+# extracted locally instead of queueing behind (or failing against) Gemini.
+ENHANCE_SKIP_MIN_WORDS = int(os.environ.get('ENHANCE_SKIP_MIN_WORDS', 60))
+ENHANCE_MAX_GEMINI_QUEUE = int(os.environ.get('ENHANCE_MAX_GEMINI_QUEUE', 8))
+EXTRACTIVE_SUMMARY_WORDS = 120
+
+@timed_stage('enhance')
+async def summarize_article(article, user_context):
+    """
+    Summary for an article and the tier that produced it: 'original' (the
+    source description is good enough), 'llm' (rewritten by Gemini) or
+    'extractive' (local summary when Gemini is overloaded or fails)
+    """
+    description = article.get('description') or ''
+    if summarizer.description_is_good(description, ENHANCE_SKIP_MIN_WORDS):
+        tier, summary = 'original', description
+    else:
+        gemini = get_gemini()
+        summary = None
+        if not gemini.breaker.is_open and gemini.queued <= ENHANCE_MAX_GEMINI_QUEUE:
+            summary = await enhance_real_article_with_gemini(article, user_context)
+        tier = 'llm' if summary else 'extractive'
+        if not summary:
+            summary = summarizer.extractive_summary(
+                article.get('title'), description, article.get('content'), EXTRACTIVE_SUMMARY_WORDS
+            ) or 'Summary not available'
+    record_enhancement_tier(tier)
+    return summary, tier
+
 async def enhance_real_article_with_gemini(article, user_context):
-    """Use Gemini to enhance REAL articles while keeping them authentic"""
+    """Use Gemini to enhance REAL articles while keeping them authentic; None if it cannot"""
     enhancement_prompt = f"""
     You are a professional news editor. Enhance this REAL news article summary for someone interested in "{user_context}".
 
@@ -654,23 +1331,23 @@ async def enhance_real_article_with_gemini(article, user_context):
     """
     
     try:
-        response = model.generate_content(
+        response_text = await get_gemini().generate(
             enhancement_prompt,
-            generation_config=genai.GenerationConfig(
-                temperature=0.3,
-                max_output_tokens=350
-            )
+            temperature=0.3,
+            max_output_tokens=350
         )
-        enhanced_text = response.text.strip()
+        enhanced_text = response_text.strip()
         
         if len(enhanced_text) > 50 and enhanced_text != article.get('description', ''):
             return enhanced_text
-        else:
-            return article.get('description', 'Summary not available')
+        return None
+    except circuit_breaker.CircuitOpenError:
+        return None
     except Exception as e:
         logger.error(f"Enhancement failed: {e}")
-        return article.get('description', 'Summary not available')
+        return None
 
+@timed_stage('filter')
 async def filter_articles_with_gemini(articles, user_prompt):
     """Use Gemini to identify most relevant REAL articles"""
     if len(articles) <= 8:
@@ -688,30 +1365,32 @@ async def filter_articles_with_gemini(articles, user_prompt):
     Return indices of articles scoring 6+ as JSON array.
     """
     
+    batch_size = 8
+    
+    async def rate_batch(i):
+        batch = articles[i:i+batch_size]
+        batch_text = ""
+        
+        for idx, article in enumerate(batch):
+            title = article.get('title', '')[:100]
+            desc = article.get('description', '')[:150]
+            batch_text += f"Article {i+idx}: {title} - {desc}\n"
+        
+        response_text = await get_gemini().generate(
+            f"{filtering_prompt}\n\nArticles:\n{batch_text}\n\nRelevant indices:",
+            temperature=0.1,
+            max_output_tokens=100,
+            response_mime_type="application/json"
+        )
+        batch_relevant = json.loads(response_text)
+        return [i + idx for idx in batch_relevant if isinstance(idx, int)]
+    
     try:
         relevant_indices = []
-        batch_size = 8
         
-        for i in range(0, len(articles), batch_size):
-            batch = articles[i:i+batch_size]
-            batch_text = ""
-            
-            for idx, article in enumerate(batch):
-                title = article.get('title', '')[:100]
-                desc = article.get('description', '')[:150]
-                batch_text += f"Article {i+idx}: {title} - {desc}\n"
-            
-            response = model.generate_content(
-                f"{filtering_prompt}\n\nArticles:\n{batch_text}\n\nRelevant indices:",
-                generation_config=genai.GenerationConfig(
-                    temperature=0.1,
-                    max_output_tokens=100,
-                    response_mime_type="application/json"
-                )
-            )
-            
-            batch_relevant = json.loads(response.text)
-            relevant_indices.extend([i + idx for idx in batch_relevant if isinstance(idx, int)])
+        # Batches are rated concurrently; indices keep the batch order
+        for batch_indices in await asyncio.gather(*(rate_batch(i) for i in range(0, len(articles), batch_size))):
+            relevant_indices.extend(batch_indices)
         
         filtered = [articles[idx] for idx in relevant_indices if idx < len(articles)]
         return filtered if filtered else articles[:8]
@@ -733,131 +1412,519 @@ def remove_duplicates(articles):
     return unique_articles
 
 # --- Step 9: Main News Fetching Function ---
-async def fetch_and_store_category_news(user_id, category_id, keywords, original_prompt=""):
+# News item documents are stored in a compact layout (schemaVersion 2):
+# keywords live on the category only, the single summary is stored once
+# (mainSource/mainUrl are not repeated in a summaries list), description is
+# kept only when it differs from the summary, derived flags are not stored
+# and the remaining flags only when they differ from their default.
+# news_item_fields() expands both v1 and v2 documents to the full field set.
+NEWS_ITEM_SCHEMA_VERSION = 2
+REAL_IMAGE_SOURCES = ('source-real', 'extracted-real')
+
+def compact_news_item(fields):
+    """v2 document for the full (v1) fields of a news item"""
+    summary = fields.get('summary')
+    if summary is None and fields.get('summaries'):
+        summary = fields['summaries'][0].get('summary')
+    description = fields.get('originalDescription', fields.get('description'))
+    document = {
+        "schemaVersion": NEWS_ITEM_SCHEMA_VERSION,
+        "mainTitle": fields.get('mainTitle'),
+        "mainSource": fields.get('mainSource'),
+        "mainUrl": fields.get('mainUrl'),
+        "imageUrl": fields.get('imageUrl'),
+        "imageSource": fields.get('imageSource', 'placeholder'),
+        "summary": summary,
+    }
+    if description and description != summary:
+        document['description'] = description
+    if not fields.get('enhancedByGemini', True):
+        document['enhancedByGemini'] = False
+    if fields.get('isPending'):
+        document['isPending'] = True
+    return document
+
+def news_item_fields(news_data):
+    """Full field set of a stored news item, whichever schema version it was written with"""
+    if news_data.get('schemaVersion', 1) < 2:
+        return news_data
+    has_real_image = news_data.get('imageSource') in REAL_IMAGE_SOURCES
+    return {
+        **news_data,
+        "summaries": [{
+            "source": news_data.get('mainSource'),
+            "summary": news_data.get('summary'),
+            "url": news_data.get('mainUrl')
+        }],
+        "isRealNews": True,
+        "hasRealImage": has_real_image,
+        "imageRelevance": 'high' if has_real_image else 'low',
+        "enhancedByGemini": news_data.get('enhancedByGemini', True),
+        "isPending": news_data.get('isPending', False),
+        "originalDescription": news_data.get('description', news_data.get('summary')),
+    }
+
+def build_news_item(article):
+    """Stored (v2) news item document for a processed article"""
+    return compact_news_item({
+        "mainTitle": article.get('title'),
+        "mainSource": article.get('source', {}).get('name'),
+        "mainUrl": article.get('url'),
+        "imageUrl": proxied_image_url(article.get('urlToImage')),
+        "imageSource": article.get('imageSource', 'placeholder'),
+        "summary": article.get('enhancedSummary', article.get('description')),
+        "originalDescription": article.get('description'),
+        "enhancedByGemini": article.get('enhancedByGemini', True),
+        "isPending": article.get('isPending', False),
+    })
+
+def serialize_news_item(item_id, news_data):
+    """API representation of a stored news item"""
+    news_data = news_item_fields(news_data)
+    return {
+        "id": item_id,
+        "mainTitle": news_data.get('mainTitle'),
+        "mainSource": news_data.get('mainSource'),
+        "mainUrl": news_data.get('mainUrl'),
+        "imageUrl": news_data.get('imageUrl'),
+        "publishedAt": news_data.get('publishedAt').isoformat() if news_data.get('publishedAt') else None,
+        "summaries": news_data.get('summaries', []),
+        "isRealNews": news_data.get('isRealNews', True),
+        "hasRealImage": news_data.get('hasRealImage', False),
+        "imageSource": news_data.get('imageSource', 'placeholder'),
+        "imageRelevance": news_data.get('imageRelevance', 'low'),
+        "enhancedByGemini": news_data.get('enhancedByGemini', True),
+        "isPending": news_data.get('isPending', False)
+    }
+
+# Articles enhanced concurrently per pipeline; starts are still spaced by
+# ARTICLE_START_INTERVAL_SECONDS so Gemini sees the same request pacing.
+ARTICLE_CONCURRENCY = int(os.environ.get('ARTICLE_CONCURRENCY', 4))
+ARTICLE_START_INTERVAL_SECONDS = 0.3
+
+# Article tasks finishing after a deadline_ms response; kept referenced until done
+_background_tasks = set()
+
+def draft_article(article):
+    """
+    Best-so-far copy of an article whose processing has not finished:
+    keeps whatever is already done, raw description and placeholder otherwise
+    """
+    draft = dict(article)
+    draft['isPending'] = True
+    if 'enhancedSummary' not in draft:
+        draft['enhancedSummary'] = article.get('description')
+        draft['enhancedByGemini'] = False
+    if 'imageSource' not in draft:
+        draft['urlToImage'] = get_contextual_placeholder_image(article.get('title', ''), article.get('description', ''))
+        draft['imageSource'] = 'placeholder'
+        draft['imageRelevance'] = 'low'
+        draft['hasRealImage'] = False
+    return draft
+
+async def process_article(index, total, article, original_prompt, semaphore):
+    """Enhance the summary and resolve the image of one article (in place)"""
+    await asyncio.sleep(index * ARTICLE_START_INTERVAL_SECONDS)
+    async with semaphore:
+        try:
+            logger.info(f"🔄 Processing article {index+1}/{total}")
+            
+            # Enhance summary (Gemini, the source description or a local extract)
+            # Keyed on the prompt itself (normalized), not its canonical topic:
+            # a summary is written for one prompt's context
+            enhanced_summary, tier = await enhance_flights.do(
+                (article.get('url') or article.get('title'), canonical_prompts.normalize(original_prompt)),
+                lambda: summarize_article(article, original_prompt)
+            )
+            article['enhancedSummary'] = enhanced_summary
+            article['enhancedByGemini'] = tier == 'llm'
+            
+            # Real image priority extraction
+            image_result = await get_real_image_priority(article)
+            
+            article['urlToImage'] = image_result['imageUrl']
+            article['imageSource'] = image_result['source']
+            article['imageRelevance'] = image_result['relevance']
+            article['hasRealImage'] = image_result['source'] in REAL_IMAGE_SOURCES
+            
+            logger.info(f"✅ Article {index+1} processed - Image: {image_result['source']} (Real: {article['hasRealImage']})")
+            
+        except Exception as e:
+            logger.error(f"❌ Article {index+1} processing failed: {e}")
+    return article
+
+async def finish_pending_articles(user_id, category_id, pending):
+    """Wait for articles still processing after a deadline and update their stored drafts in place"""
+    repository = get_repository()
+
+    finished = {}
+
+    async def finish(item_id, task):
+        article = await task
+        # update merges, so flags left out of the compact document as defaults
+        # must be written explicitly to clear the draft's values
+        fields = {"enhancedByGemini": True, "isPending": False, **build_news_item(article)}
+        if await asyncio.to_thread(repository.update_news_item, user_id, category_id, item_id, fields):
+            finished[item_id] = fields
+        else:
+            logger.info(f"Pending article {item_id} was removed before it finished")
+
+    results = await asyncio.gather(*(finish(item_id, task) for item_id, task in pending), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"❌ Updating pending article failed: {result}")
+    
+    # Swap the finished cards into the feed snapshot, keeping its order, and
+    # pick the category thumbnail again now that the drafts' real images are in
+    snapshot = await asyncio.to_thread(repository.get_feed_snapshot, user_id, category_id)
+    if snapshot and finished:
+        cards = [
+            feed_card(card['id'], finished[card['id']]) if card['id'] in finished else card
+            for card in snapshot['items']
+        ]
+        await asyncio.to_thread(repository.write_feed_snapshot, user_id, category_id, cards)
+        thumbnail_url = category_thumbnail(cards)
+        if thumbnail_url != category_thumbnail(snapshot['items']):
+            await asyncio.to_thread(repository.update_category_thumbnail, user_id, category_id, thumbnail_url)
+    logger.info(f"🎉 Finished {len(pending)} pending articles in background")
+
+def category_thumbnail(news_items):
+    """Thumbnail for the categories list: the first real image, else the first image"""
+    for news_item in news_items:
+        if news_item.get('imageSource') in REAL_IMAGE_SOURCES and news_item.get('imageUrl'):
+            return news_item['imageUrl']
+    return next((news_item['imageUrl'] for news_item in news_items if news_item.get('imageUrl')), None)
+
+FEED_SUMMARY_CHARS = 280
+
+def feed_card(item_id, news_item):
+    """Compact feed snapshot entry: the list fields of a news item with a shortened summary"""
+    card = serialize_news_item(item_id, news_item)
+    card.pop('publishedAt')
+    summaries = []
+    for summary in card['summaries'][:1]:
+        text = summary.get('summary') or ''
+        if len(text) > FEED_SUMMARY_CHARS:
+            text = text[:FEED_SUMMARY_CHARS].rsplit(' ', 1)[0] + '…'
+        summaries.append({**summary, "summary": text})
+    card['summaries'] = summaries
+    return card
+
+def emit_event(on_event, event, data):
+    """Send a pipeline event to an optional listener without ever failing the pipeline"""
+    if on_event is None:
+        return
+    try:
+        on_event(event, data)
+    except Exception as e:
+        logger.error(f"Pipeline event listener failed: {e}")
+
+# Articles of source fetches still in flight, by keyword set, for callers whose
+# deadline runs out before every source has answered
+_partial_sources = {}
+
+async def fetch_source_articles(keywords, refresh=False, deadline=None, max_age=None):
+    """
+    Articles from every source for a keyword set, cached per set and fetched
+    once for concurrent callers; `refresh` skips the lookup (prewarming) and
+    `max_age` only accepts cache entries stored at most that many seconds ago.
+    With a `deadline`, returns the articles of the sources that have answered
+    when it runs out (the fetch itself finishes and fills the cache).
+    """
+    cache_key = topics.keyword_set_key(keywords)
+    if not refresh:
+        cached = source_cache.get(cache_key, max_age=max_age)
+        if cached:
+            return cached
+    flight = source_flights.do(cache_key, lambda: fetch_all_sources(keywords, cache_key))
+    if deadline is None:
+        return await flight
+    try:
+        return await deadline.wait('fetch_sources', flight)
+    except DeadlineExceeded:
+        partial = [article for articles in _partial_sources.get(cache_key, []) for article in articles]
+        logger.warning(f"⏱️ Deadline reached fetching sources, continuing with {len(partial)} articles")
+        return copy.deepcopy(partial)
+
+async def fetch_all_sources(keywords, cache_key):
+    # Sources are queried concurrently and merged in priority order: NewsAPI
+    # (provides real images), NewsData.io, then Google News RSS
+    sources = [fetch_real_news_with_newsapi, fetch_real_news_newsdata, fetch_real_news_google_rss]
+    results = [None] * len(sources)
+    _partial_sources[cache_key] = answered = []
+
+    async def fetch(index, source):
+        results[index] = await source(keywords)
+        answered.append(results[index])
+
+    try:
+        with stage_timer('fetch_sources'):
+            await asyncio.gather(*(fetch(index, source) for index, source in enumerate(sources)))
+    finally:
+        if _partial_sources.get(cache_key) is answered:
+            del _partial_sources[cache_key]
+    
+    all_articles = [article for articles in results for article in articles]
+    if all_articles:
+        source_cache.set(cache_key, all_articles)
+    return all_articles
+
+@timed_stage('pipeline')
+async def fetch_and_store_category_news(user_id, category_id, keywords, original_prompt="", on_event=None, deadline=None,
+                                        source_max_age=None):
     """
     Fetch REAL news with priority on real images from actual sources
+
+    on_event(event, data), if given, receives 'progress' events as each stage
+    starts/finishes and an 'article' event as soon as each article is ready.
+
+    With a `deadline`, articles still being processed when it expires are
+    stored as drafts (raw description, placeholder image, isPending) and
+    updated in place once their processing finishes in the background.
+
+    `source_max_age` limits how old cached source articles may be (user
+    refreshes want current news; category creation takes any cached entry).
     """
     logger.info(f"🚀 REAL IMAGE PRIORITY FETCHING for: '{original_prompt}'")
     
     try:
-        all_articles = []
-        
-        # Source 1: NewsAPI (provides real images) - highest priority
-        newsapi_articles = await fetch_real_news_with_newsapi(keywords)
-        all_articles.extend(newsapi_articles)
+        popular_topics.record(original_prompt, keywords)
         
-        # Source 2: NewsData.io
-        newsdata_articles = await fetch_real_news_newsdata(keywords)
-        all_articles.extend(newsdata_articles)
+        emit_event(on_event, 'progress', {"stage": "fetch_sources", "status": "started"})
+        all_articles = await fetch_source_articles(keywords, deadline=deadline, max_age=source_max_age)
         
-        # Source 3: Google News RSS (with aggressive resolution)
-        google_articles = await fetch_real_news_google_rss(keywords)
-        all_articles.extend(google_articles)
+        emit_event(on_event, 'progress', {"stage": "fetch_sources", "status": "done", "articles": len(all_articles)})
         
         if not all_articles:
             logger.warning("❌ No REAL articles found")
             return 0
         
         # Remove duplicates and filter
-        unique_articles = remove_duplicates(all_articles)
-        relevant_articles = await filter_articles_with_gemini(unique_articles, original_prompt)
+        with stage_timer('dedupe'):
+            unique_articles = remove_duplicates(all_articles)
+        emit_event(on_event, 'progress', {"stage": "filter", "status": "started", "articles": len(unique_articles)})
+        topic_key = (topics.keyword_set_key(keywords), canonical_prompts.normalize(original_prompt))
+        filtering = filter_flights.do(topic_key, lambda: filter_articles_with_gemini(unique_articles, original_prompt))
+        try:
+            relevant_articles = await (deadline.wait('filter', filtering) if deadline else filtering)
+        except DeadlineExceeded:
+            # No budget left for the Gemini relevance pass; keep source order
+            relevant_articles = unique_articles
+        emit_event(on_event, 'progress', {"stage": "filter", "status": "done", "articles": len(relevant_articles[:8])})
         
         logger.info(f"📰 Processing {len(relevant_articles)} articles with REAL IMAGE PRIORITY")
         
-        # Process each article with real image priority
-        enhanced_articles = []
-        real_image_count = 0
+        # Process articles concurrently with real image priority
+        selected = relevant_articles[:8]
+        item_ids = [storage.new_document_id() for _ in selected]
+        semaphore = asyncio.Semaphore(ARTICLE_CONCURRENCY)
+        tasks = {}
+        
+        emit_event(on_event, 'progress', {"stage": "process_articles", "status": "started"})
+        for i, article in enumerate(selected):
+            task = asyncio.create_task(process_article(i, len(selected), article, original_prompt, semaphore))
+            task.add_done_callback(
+                lambda t, i=i: emit_event(on_event, 'article', {
+                    "index": i, "item": serialize_news_item(item_ids[i], build_news_item(t.result()))
+                })
+            )
+            tasks[task] = i
         
-        for i, article in enumerate(relevant_articles[:8]):
-            try:
-                logger.info(f"🔄 Processing article {i+1}/{len(relevant_articles[:8])}")
-                
-                # Enhance summary
-                enhanced_summary = await enhance_real_article_with_gemini(article, original_prompt)
-                article['enhancedSummary'] = enhanced_summary
-                
-                # Real image priority extraction
-                image_result = await get_real_image_priority(article)
-                
-                article['urlToImage'] = image_result['imageUrl']
-                article['imageSource'] = image_result['source']
-                article['imageRelevance'] = image_result['relevance']
-                article['hasRealImage'] = image_result['source'] in ['source-real', 'extracted-real']
-                
-                if article['hasRealImage']:
-                    real_image_count += 1
-                
-                enhanced_articles.append(article)
-                
-                logger.info(f"✅ Article {i+1} processed - Image: {image_result['source']} (Real: {article['hasRealImage']})")
-                
-                # Add delay
-                await asyncio.sleep(0.3)
-                
-            except Exception as e:
-                logger.error(f"❌ Article {i+1} processing failed: {e}")
-                enhanced_articles.append(article)
+        pending = set()
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=deadline.remaining() if deadline else None)
+        
+        news_items = []
+        for task, i in tasks.items():
+            if task in pending:
+                news_items.append(build_news_item(draft_article(selected[i])))
+            else:
+                news_items.append(build_news_item(task.result()))
+        real_image_count = sum(1 for item in news_items if item['imageSource'] in REAL_IMAGE_SOURCES)
+        emit_event(on_event, 'progress', {"stage": "process_articles", "status": "done", "articles": len(news_items)})
         
         # Store articles
-        fetched_count = 0
-        news_items_ref = db.collection('users').document(user_id).collection('categories').document(category_id).collection('news_items')
-        
-        for article in enhanced_articles:
-            news_item_data = {
-                "mainTitle": article.get('title'),
-                "mainSource": article.get('source', {}).get('name'),
-                "mainUrl": article.get('url'),
-                "imageUrl": article.get('urlToImage'),
-                "publishedAt": firestore.SERVER_TIMESTAMP,
-                "summaries": [{
-                    "source": article.get('source', {}).get('name'),
-                    "summary": article.get('enhancedSummary', article.get('description')),
-                    "url": article.get('url')
-                }],
-                "keywords": keywords,
-                "isRealNews": True,
-                "hasRealImage": article.get('hasRealImage', False),
-                "imageSource": article.get('imageSource', 'placeholder'),
-                "imageRelevance": article.get('imageRelevance', 'low'),
-                "enhancedByGemini": True,
-                "originalDescription": article.get('description'),
-                "articleId": str(uuid.uuid4())
-            }
-            
-            news_items_ref.add(news_item_data)
-            fetched_count += 1
+        with stage_timer('store'):
+            repository = get_repository()
+            await asyncio.to_thread(repository.add_news_items, user_id, category_id, news_items, item_ids)
+            await asyncio.to_thread(
+                repository.record_category_refresh, user_id, category_id, category_thumbnail(news_items)
+            )
+            await asyncio.to_thread(repository.write_feed_snapshot, user_id, category_id, [
+                feed_card(item_id, news_item) for item_id, news_item in zip(item_ids, news_items)
+            ])
+            fetched_count = len(news_items)
         
         logger.info(f"🎉 Successfully stored {fetched_count} articles - {real_image_count} with REAL images")
+        
+        if pending:
+            record_deadline_exceeded('process_articles')
+            logger.info(f"⏱️ Deadline reached with {len(pending)} articles pending; finishing them in background")
+            finisher = asyncio.create_task(finish_pending_articles(
+                user_id, category_id, [(item_ids[tasks[task]], task) for task in pending]
+            ))
+            _background_tasks.add(finisher)
+            finisher.add_done_callback(_background_tasks.discard)
         return fetched_count
         
     except Exception as e:
         logger.error(f"❌ Real image priority fetching failed: {e}")
         return 0
 
+# --- Popular Topic Prewarming ---
+# Every PREWARM_INTERVAL_SECONDS (during PREWARM_HOURS, UTC) the most requested
+# prompts and keyword sets get their keywords, source articles and images
+# re-resolved when their cache entries would expire before the next run.
+PREWARM_TOP_N = int(os.environ.get('PREWARM_TOP_N', 10))
+PREWARM_INTERVAL_SECONDS = float(os.environ.get('PREWARM_INTERVAL_SECONDS', 600))
+PREWARM_HOURS = topics.parse_hours(os.environ.get('PREWARM_HOURS', ''))
+PREWARM_IMAGES_PER_TOPIC = 12
+
+async def prewarm_popular_topics(top_n=PREWARM_TOP_N):
+    """Refresh cached keywords, source articles and images of the top topics"""
+    stats = {"prompts": 0, "keywordSets": 0, "images": 0}
+    semaphore = asyncio.Semaphore(ARTICLE_CONCURRENCY)
+
+    async def warm_image(article):
+        async with semaphore:
+            await get_real_image_priority(article)
+
+    with stage_timer('prewarm'):
+        for prompt in popular_topics.top_prompts(top_n):
+            if keyword_cache.expires_in(canonical_prompts.canonicalize(prompt)) <= PREWARM_INTERVAL_SECONDS:
+                await get_smart_keywords_with_gemini(prompt, refresh=True)
+                stats['prompts'] += 1
+        
+        for keywords in popular_topics.top_keyword_sets(top_n):
+            if source_cache.expires_in(topics.keyword_set_key(keywords)) > PREWARM_INTERVAL_SECONDS:
+                continue
+            articles = remove_duplicates(await fetch_source_articles(keywords, refresh=True))
+            stats['keywordSets'] += 1
+            # Images of articles already seen stay cached; only new ones resolve
+            warming = [
+                warm_image(article) for article in articles[:PREWARM_IMAGES_PER_TOPIC]
+                if image_cache.expires_in(article.get('url') or article.get('title')) <= PREWARM_INTERVAL_SECONDS
+            ]
+            await asyncio.gather(*warming, return_exceptions=True)
+            stats['images'] += len(warming)
+    
+    logger.info(
+        f"🔥 Prewarmed {stats['prompts']} prompts, {stats['keywordSets']} keyword sets and {stats['images']} images"
+    )
+    return stats
+
+def _init_topic_prewarmer():
+    return topics.PrewarmScheduler(
+        lambda: shared_loop.run(prewarm_popular_topics()), PREWARM_INTERVAL_SECONDS, PREWARM_HOURS
+    ).start()
+
+def get_topic_prewarmer():
+    """Periodic prewarm job of this worker, started on first use"""
+    return _get_client('topic_prewarmer', _init_topic_prewarmer)
+
+# --- Admission Control ---
+# At most PIPELINE_MAX_IN_FLIGHT pipelines run per worker (and per endpoint
+# at most its PIPELINE_ENDPOINT_LIMITS entry); up to PIPELINE_MAX_QUEUE more
+# wait PIPELINE_QUEUE_TIMEOUT_SECONDS for a slot, the rest get 429.
+pipeline_admission = admission.AdmissionController(
+    max_in_flight=int(os.environ.get('PIPELINE_MAX_IN_FLIGHT', 8)),
+    max_queue=int(os.environ.get('PIPELINE_MAX_QUEUE', 16)),
+    queue_timeout=float(os.environ.get('PIPELINE_QUEUE_TIMEOUT_SECONDS', 5)),
+    endpoint_limits=admission.parse_limits(os.environ.get('PIPELINE_ENDPOINT_LIMITS', '')),
+)
+
+def too_many_requests(rejection):
+    response = jsonify({"error": "Server is busy, please retry shortly", "retryAfter": rejection.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(rejection.retry_after)
+    return response
+
+def admitted(endpoint):
+    """Run an async pipeline view only once admitted for `endpoint`; 429 when saturated"""
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            try:
+                admitted_at = await pipeline_admission.acquire(endpoint)
+            except admission.AdmissionRejected as e:
+                logger.warning(f"🚦 Rejected {endpoint} request, retry after {e.retry_after}s")
+                return too_many_requests(e)
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                pipeline_admission.release(endpoint, admitted_at)
+        return wrapper
+    return decorator
+
 # --- Step 10: API Endpoints ---
-@app.route('/')
+def request_deadline(data):
+    """
+    Deadline for a request's optional `deadline_ms` (JSON body or query string).
+    Returns None when absent; raises ValueError unless it is a positive integer
+    (a JSON integer, or digits in the query string).
+    """
+    value = (data or {}).get('deadline_ms', request.args.get('deadline_ms'))
+    if value is None or value == '':
+        return None
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValueError("deadline_ms must be a positive integer")
+    return Deadline(value / 1000)
+
+async def best_so_far_response(user_id, category_id):
+    """Stored items (finished and pending) for a response returned at its deadline"""
+    news_items = await asyncio.to_thread(get_repository().list_news_items, user_id, category_id)
+    serialized = [serialize_news_item(news_data['id'], news_data) for news_data in news_items]
+    return {
+        "newsItems": serialized,
+        "pendingCount": sum(1 for item in serialized if item['isPending'])
+    }
+
+@api.route('/')
 def home():
     return "NewsGenius Backend - REAL News with Real Image Priority!"
 
-@app.route('/api/user/<user_id>/categories', methods=['GET'])
-def get_user_categories(user_id):
+@api.route('/api/user/<user_id>/categories', methods=['GET'])
+async def get_user_categories(user_id):
     try:
-        categories_ref = db.collection('users').document(user_id).collection('categories')
+        repository = get_repository()
+        category_list = await asyncio.to_thread(repository.list_categories, user_id)
+        
+        # Categories written before newsCount was maintained are counted with
+        # aggregation queries, all at once, and get the count stored so they
+        # are only counted once
+        uncounted = [category_data for category_data in category_list if 'newsCount' not in category_data]
+        counts = await asyncio.gather(*(
+            asyncio.to_thread(repository.count_news_items, user_id, category_data['id'])
+            for category_data in uncounted
+        ))
+        for category_data, count in zip(uncounted, counts):
+            category_data['newsCount'] = count
+        if uncounted:
+            await asyncio.gather(*(
+                asyncio.to_thread(repository.backfill_news_count, user_id, category_data['id'], category_data['newsCount'])
+                for category_data in uncounted
+            ))
+        
         categories = []
-        for doc in categories_ref.stream():
-            category_data = doc.to_dict()
+        for category_data in category_list:
             categories.append({
-                "id": doc.id,
+                "id": category_data['id'],
                 "prompt": category_data.get('prompt'),
                 "keywords": category_data.get('keywords'),
-                "createdAt": category_data.get('createdAt').isoformat() if category_data.get('createdAt') else None
+                "createdAt": category_data.get('createdAt').isoformat() if category_data.get('createdAt') else None,
+                "newsCount": category_data['newsCount'],
+                "lastRefreshedAt": category_data.get('lastRefreshedAt').isoformat() if category_data.get('lastRefreshedAt') else None,
+                "thumbnailUrl": category_data.get('thumbnailUrl')
             })
         return jsonify({"categories": categories})
     except Exception as e:
         logger.error(f"Error fetching categories: {e}")
         return jsonify({"error": "Failed to retrieve categories"}), 500
 
-@app.route('/api/user/<user_id>/categories', methods=['POST'])
+@api.route('/api/user/<user_id>/categories', methods=['POST'])
+@admitted('create_category')
 async def create_category_and_fetch_news(user_id):
     data = request.get_json()
     user_prompt = data.get('prompt', '')
@@ -866,129 +1933,419 @@ async def create_category_and_fetch_news(user_id):
         return jsonify({"error": "Prompt is required"}), 400
 
     try:
-        keywords = await get_smart_keywords_with_gemini(user_prompt)
+        deadline = request_deadline(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "deadline_ms must be a positive integer"}), 400
+
+    try:
+        keywords = await get_smart_keywords_with_gemini(user_prompt, deadline=deadline)
         logger.info(f"Generated keywords for '{user_prompt}': {keywords}")
         
         if not keywords:
             return jsonify({"error": "Could not generate keywords"}), 400
 
-        categories_ref = db.collection('users').document(user_id).collection('categories')
         category_data = {
             "prompt": user_prompt,
             "keywords": keywords,
-            "createdAt": firestore.SERVER_TIMESTAMP,
             "newsSource": "real-news-real-image-priority"
         }
-        doc_ref = categories_ref.add(category_data)
-        category_id = doc_ref[1].id
+        category_id = await asyncio.to_thread(get_repository().create_category, user_id, category_data)
 
-        fetched_news_count = await fetch_and_store_category_news(user_id, category_id, keywords, user_prompt)
+        with pipeline_in_flight('create_category'):
+            fetched_news_count = await fetch_and_store_category_news(
+                user_id, category_id, keywords, user_prompt, deadline=deadline
+            )
 
-        return jsonify({
+        response = {
             "message": "Category created with REAL news and real image priority",
             "categoryId": category_id,
             "prompt": user_prompt,
             "keywords": keywords,
             "fetchedNewsCount": fetched_news_count,
             "newsSource": "real-news-real-image-priority"
-        })
+        }
+        if deadline is not None:
+            response.update(await best_so_far_response(user_id, category_id))
+        return jsonify(response)
 
     except Exception as e:
         logger.error(f"Error creating category: {e}")
         return jsonify({"error": f"Failed to create category: {e}"}), 500
 
-@app.route('/api/user/<user_id>/categories/<category_id>/news', methods=['GET'])
+@api.route('/api/user/<user_id>/categories/<category_id>/news', methods=['GET'])
 def get_category_news(user_id, category_id):
     try:
-        news_items_ref = db.collection('users').document(user_id).collection('categories').document(category_id).collection('news_items')
+        repository = get_repository()
+        
+        # One document read from the feed snapshot; ?view=full (or a category
+        # without a snapshot yet) reads every news item instead
+        if request.args.get('view') != 'full':
+            snapshot = repository.get_feed_snapshot(user_id, category_id)
+            record_cache('feed_snapshot', snapshot is not None)
+            if snapshot is not None:
+                published_at = snapshot['updatedAt'].isoformat() if snapshot.get('updatedAt') else None
+                return jsonify({"newsItems": [{**card, "publishedAt": published_at} for card in snapshot['items']]})
+        
+        # No snapshot: the category may be gone or being deleted (its snapshot
+        # is dropped when it is marked deleted)
+        if repository.get_category(user_id, category_id) is None:
+            return jsonify({"error": "Category not found"}), 404
         news_items = []
-        for doc in news_items_ref.order_by('publishedAt', direction=firestore.Query.DESCENDING).stream():
-            news_data = doc.to_dict()
-            news_items.append({
-                "id": doc.id,
-                "mainTitle": news_data.get('mainTitle'),
-                "mainSource": news_data.get('mainSource'),
-                "mainUrl": news_data.get('mainUrl'),
-                "imageUrl": news_data.get('imageUrl'),
-                "publishedAt": news_data.get('publishedAt').isoformat() if news_data.get('publishedAt') else None,
-                "summaries": news_data.get('summaries', []),
-                "isRealNews": news_data.get('isRealNews', True),
-                "hasRealImage": news_data.get('hasRealImage', False),
-                "imageSource": news_data.get('imageSource', 'placeholder'),
-                "imageRelevance": news_data.get('imageRelevance', 'low'),
-                "enhancedByGemini": news_data.get('enhancedByGemini', True)
-            })
+        for news_data in repository.list_news_items(user_id, category_id):
+            news_items.append(serialize_news_item(news_data['id'], news_data))
         return jsonify({"newsItems": news_items})
     except Exception as e:
         logger.error(f"Error fetching news: {e}")
         return jsonify({"error": "Failed to retrieve news"}), 500
 
-@app.route('/api/user/<user_id>/categories/<category_id>/refresh_news', methods=['POST'])
+@api.route('/api/user/<user_id>/categories/<category_id>/news/<item_id>', methods=['GET'])
+def get_news_item_detail(user_id, category_id, item_id):
+    try:
+        repository = get_repository()
+        news_data = repository.get_news_item(user_id, category_id, item_id)
+        if news_data is None:
+            return jsonify({"error": "News item not found"}), 404
+        news_data = news_item_fields(news_data)
+        keywords = news_data.get('keywords')
+        if keywords is None:
+            # v2 items leave keywords to the category
+            category_data = repository.get_category(user_id, category_id) or {}
+            keywords = category_data.get('keywords', [])
+        return jsonify({"newsItem": {
+            **serialize_news_item(news_data['id'], news_data),
+            "keywords": keywords,
+            "originalDescription": news_data.get('originalDescription')
+        }})
+    except Exception as e:
+        logger.error(f"Error fetching news item: {e}")
+        return jsonify({"error": "Failed to retrieve news item"}), 500
+
+async def refresh_category(user_id, category_id, category_data, log):
+    """
+    Clear a category's news and fetch it again, appending progress and
+    articles to `log` as they happen
+    """
+    try:
+        with pipeline_in_flight('refresh_news'):
+            log.append('progress', {"stage": "clear_news", "status": "started"})
+            with stage_timer('clear_news'):
+                await asyncio.to_thread(get_repository().clear_news_items, user_id, category_id)
+            log.append('progress', {"stage": "clear_news", "status": "done"})
+
+            fetched_count = await fetch_and_store_category_news(
+                user_id, category_id, category_data.get('keywords'), category_data.get('prompt', ''),
+                on_event=log.append, source_max_age=REFRESH_SOURCE_MAX_AGE_SECONDS
+            )
+        log.append('done', {"fetchedNewsCount": fetched_count})
+        return fetched_count
+    except Exception as e:
+        logger.error(f"❌ Refresh failed: {e}")
+        log.append('error', {"error": "Failed to refresh news"})
+        raise
+    finally:
+        log.finish()
+
+def launch_refresh(user_id, category_id, category_data):
+    """
+    Future of the fetched count of the category's refresh: joins the one
+    already running (double click, second device, a streamed refresh), else
+    starts one. Every refresh appends to the category's event log, so
+    news/stream can follow it whichever endpoint started it. Call on the
+    shared loop.
+    """
+    key = (user_id, category_id)
+
+    def start():
+        # The log exists as soon as the refresh does, before its first await
+        log, _ = refresh_streams.start(key)
+        return refresh_category(user_id, category_id, category_data, log)
+    return refresh_flights.launch(key, start)
+
+def refresh_progress(log):
+    """Best-so-far response of a refresh still running: the articles it has finished so far"""
+    items, selected = {}, None
+    for _, event, data in log.read(0, 0):
+        if event == 'article':
+            items[data['index']] = data['item']
+        elif event == 'progress' and data.get('stage') == 'filter' and data.get('status') == 'done':
+            selected = data['articles']
+    return {
+        "newsItems": [items[index] for index in sorted(items)],
+        "pendingCount": max(0, (selected or 0) - len(items)),
+    }
+
+@api.route('/api/user/<user_id>/categories/<category_id>/refresh_news', methods=['POST'])
+@admitted('refresh_news')
 async def refresh_category_news_endpoint(user_id, category_id):
     try:
-        category_doc = db.collection('users').document(user_id).collection('categories').document(category_id).get()
-        if not category_doc.exists:
+        deadline = request_deadline(request.get_json(silent=True))
+    except (TypeError, ValueError):
+        return jsonify({"error": "deadline_ms must be a positive integer"}), 400
+
+    try:
+        category_data = await asyncio.to_thread(get_repository().get_category, user_id, category_id)
+        if category_data is None:
             return jsonify({"error": "Category not found"}), 404
 
-        category_data = category_doc.to_dict()
-        keywords = category_data.get('keywords')
-        original_prompt = category_data.get('prompt', '')
-        
-        if not keywords:
+        if not category_data.get('keywords'):
             return jsonify({"error": "No keywords found"}), 400
 
-        # Clear existing news
-        news_items_ref = db.collection('users').document(user_id).collection('categories').document(category_id).collection('news_items')
-        docs = news_items_ref.stream()
-        for doc in docs:
-            doc.reference.delete()
-
-        # Fetch fresh news with real image priority
-        fetched_count = await fetch_and_store_category_news(user_id, category_id, keywords, original_prompt)
-        return jsonify({"message": "REAL news with real image priority refreshed successfully", "fetchedNewsCount": fetched_count})
+        # One refresh per category runs at a time, shared by every caller; a
+        # deadline_ms only bounds how long this caller waits for it
+        flight = launch_refresh(user_id, category_id, category_data)
+        response = {"message": "REAL news with real image priority refreshed successfully"}
+        if deadline is None:
+            response["fetchedNewsCount"] = await flight
+            return jsonify(response)
+        try:
+            response["fetchedNewsCount"] = await deadline.wait('refresh_news', flight)
+        except DeadlineExceeded:
+            flight.cancel()
+            logger.info("⏱️ Deadline reached with the refresh still running; answering with its finished articles")
+            response.update(refresh_progress(refresh_streams.get((user_id, category_id))))
+            response["fetchedNewsCount"] = len(response["newsItems"])
+            response["streamUrl"] = f"/api/user/{user_id}/categories/{category_id}/news/stream"
+            return jsonify(response)
+        response.update(await best_so_far_response(user_id, category_id))
+        return jsonify(response)
         
     except Exception as e:
         logger.error(f"Error refreshing news: {e}")
         return jsonify({"error": "Failed to refresh news"}), 500
 
+# --- Streaming Refresh (Server-Sent Events) ---
+SSE_HEARTBEAT_SECONDS = 15
+# Reconnect delay suggested to EventSource clients
+SSE_RETRY_MS = 3000
+# Finished refreshes stay replayable this long for clients reconnecting late
+STREAM_REPLAY_SECONDS = float(os.environ.get('STREAM_REPLAY_SECONDS', 60))
+
+refresh_streams = event_log.EventLogs(retain=STREAM_REPLAY_SECONDS)
+
+def format_sse(event, data, event_id=None):
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data)}\n\n"
+
+async def start_stream_refresh(user_id, category_id, category_data):
+    """
+    Admit and start a refresh of a category unless one is already running
+    (streamed or not); returns whether this call started it. Runs on the
+    shared loop, where the admission state lives. Raises AdmissionRejected.
+    """
+    key = (user_id, category_id)
+    if key in refresh_flights:
+        return False
+    # The slot is held until the refresh finishes, not just the response
+    admitted_at = await pipeline_admission.acquire('stream_news')
+    if key in refresh_flights:
+        # Another request started one while this one was being admitted
+        pipeline_admission.release('stream_news', admitted_at)
+        return False
+
+    def finished(flight):
+        pipeline_admission.release('stream_news', admitted_at)
+        if not flight.cancelled():
+            flight.exception()  # already logged and streamed by refresh_category
+
+    # The refresh keeps going (and storing) even if every client disconnects mid-stream
+    launch_refresh(user_id, category_id, category_data).add_done_callback(finished)
+    return True
+
+@api.route('/api/user/<user_id>/categories/<category_id>/news/stream', methods=['POST'])
+def start_category_news_stream(user_id, category_id):
+    """
+    Start a refresh of a category (or join the one already running, however
+    it was started) and answer 202 with the URL to stream its events from
+    """
+    key = (user_id, category_id)
+    stream_url = f"/api/user/{user_id}/categories/{category_id}/news/stream"
+    log = refresh_streams.get(key)
+    if log is not None and not log.finished:
+        return jsonify({"message": "Refresh already running", "streamUrl": stream_url}), 202
+
+    try:
+        category_data = get_repository().get_category(user_id, category_id)
+    except Exception as e:
+        logger.error(f"Error loading category for stream: {e}")
+        return jsonify({"error": "Failed to refresh news"}), 500
+    if category_data is None:
+        return jsonify({"error": "Category not found"}), 404
+    if not category_data.get('keywords'):
+        return jsonify({"error": "No keywords found"}), 400
+
+    try:
+        started = shared_loop.run(start_stream_refresh(user_id, category_id, category_data))
+    except admission.AdmissionRejected as e:
+        logger.warning(f"🚦 Rejected stream_news request, retry after {e.retry_after}s")
+        return too_many_requests(e)
+    if not started:
+        return jsonify({"message": "Refresh already running", "streamUrl": stream_url}), 202
+    return jsonify({"message": "Refresh started", "streamUrl": stream_url}), 202
+
+@api.route('/api/user/<user_id>/categories/<category_id>/news/stream', methods=['GET'])
+def stream_category_news(user_id, category_id):
+    """
+    Stream the category's running (or just finished) refresh as Server-Sent
+    Events: 'progress' for each pipeline stage, 'article' as soon as each
+    article is enhanced and has its image, then 'done' (or 'error'). Events
+    after Last-Event-ID are replayed, so reconnects never refresh again; 204
+    (EventSource stops reconnecting) when there is nothing left to stream.
+    """
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('lastEventId') or 0)
+    except ValueError:
+        last_event_id = 0
+
+    log = refresh_streams.get((user_id, category_id))
+    if log is None or (log.finished and last_event_id >= log.last_id):
+        return Response(status=204)
+
+    def generate():
+        event_id = last_event_id
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        while True:
+            events = log.read(event_id, SSE_HEARTBEAT_SECONDS)
+            if not events:
+                if log.finished:
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for event_id, event, data in events:
+                yield format_sse(event, data, event_id)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 # --- DELETE ENDPOINT (CLEAN VERSION) ---
-@app.route('/api/user/<user_id>/categories/<category_id>', methods=['DELETE'])
+@api.before_app_request
+def start_category_deleter():
+    # Each worker resumes unfinished deletions as soon as it serves API traffic
+    if request.path.startswith('/api/'):
+        get_category_deleter()
+
+@api.before_app_request
+def start_topic_prewarmer():
+    # Popular topics are tracked per worker, so each worker prewarms its own
+    if PREWARM_INTERVAL_SECONDS > 0 and request.path.startswith('/api/'):
+        get_topic_prewarmer()
+
+@api.route('/api/user/<user_id>/categories/<category_id>', methods=['DELETE'])
 def delete_category(user_id, category_id):
     try:
         logger.info(f"🗑️ DELETE request for category {category_id} by user {user_id}")
         
-        # Delete the category document
-        category_ref = db.collection('users').document(user_id).collection('categories').document(category_id)
-        
-        # Check if category exists
-        category_doc = category_ref.get()
-        if not category_doc.exists:
+        # Hide the category now; its news items are removed in the background
+        job = get_category_deleter().delete(user_id, category_id)
+        if job is None:
             logger.error(f"Category {category_id} not found")
             return jsonify({"error": "Category not found"}), 404
         
-        # Delete all news items in this category first
-        news_items_ref = category_ref.collection('news_items')
-        docs = news_items_ref.stream()
-        deleted_news_count = 0
-        for doc in docs:
-            doc.reference.delete()
-            deleted_news_count += 1
-        
-        # Delete the category itself
-        category_ref.delete()
-        
-        logger.info(f"✅ Successfully deleted category {category_id} and {deleted_news_count} news items for user {user_id}")
+        logger.info(f"✅ Category {category_id} marked deleted for user {user_id}; removing news items in background")
         
         # Clean response without manual CORS headers
         return jsonify({
-            "message": "Category deleted successfully",
-            "deletedNewsItems": deleted_news_count
-        }), 200
+            "message": "Category deletion started",
+            "status": "deleting",
+            "deletedNewsItems": job.get('deletedNewsItems', 0)
+        }), 202
         
     except Exception as e:
         logger.error(f"❌ Error deleting category {category_id}: {e}")
         return jsonify({"error": f"Failed to delete category: {str(e)}"}), 500
 
+@api.route('/api/user/<user_id>/categories/<category_id>/deletion', methods=['GET'])
+def get_category_deletion_status(user_id, category_id):
+    try:
+        repository = get_repository()
+        job = repository.get_category_deletion(storage.deletion_job_id(user_id, category_id))
+        if job is not None:
+            return jsonify({"status": "deleting", "deletedNewsItems": job.get('deletedNewsItems', 0)})
+        if repository.get_category(user_id, category_id) is not None:
+            return jsonify({"status": "active"})
+        return jsonify({"status": "deleted"})
+    except Exception as e:
+        logger.error(f"Error fetching deletion status: {e}")
+        return jsonify({"error": "Failed to retrieve deletion status"}), 500
+
+# --- Maintenance Commands ---
+def migrate_news_schema(user_ids=None, dry_run=False):
+    """
+    Rewrite every stored news item older than NEWS_ITEM_SCHEMA_VERSION in the
+    compact layout and return counts with the estimated stored bytes before
+    and after (migrated items only)
+    """
+    repository = get_repository()
+    stats = {"categories": 0, "migrated": 0, "alreadyCurrent": 0, "bytesBefore": 0, "bytesAfter": 0}
+    for user_id in user_ids or repository.list_user_ids():
+        for category in repository.list_categories(user_id):
+            stats['categories'] += 1
+            rewritten = []
+            for news_data in repository.list_news_items(user_id, category['id']):
+                if news_data.get('schemaVersion', 1) >= NEWS_ITEM_SCHEMA_VERSION:
+                    stats['alreadyCurrent'] += 1
+                    continue
+                compact = {
+                    "id": news_data['id'],
+                    **compact_news_item(news_data),
+                    "publishedAt": news_data.get('publishedAt'),
+                }
+                stats['bytesBefore'] += storage.estimate_document_size(news_data)
+                stats['bytesAfter'] += storage.estimate_document_size(compact)
+                rewritten.append(compact)
+            if rewritten and not dry_run:
+                repository.rewrite_news_items(user_id, category['id'], rewritten)
+            stats['migrated'] += len(rewritten)
+            if rewritten:
+                logger.info(f"🗜️ Category {category['id']} of user {user_id}: {len(rewritten)} news items to v{NEWS_ITEM_SCHEMA_VERSION}")
+    return stats
+
+@click.command('migrate-news-schema')
+@click.option('--user', 'user_ids', multiple=True, help='Only migrate these users (repeatable); default: every user')
+@click.option('--dry-run', is_flag=True, help='Report the savings without writing')
+def migrate_news_schema_command(user_ids, dry_run):
+    """Rewrite stored news items in the compact v2 layout."""
+    stats = migrate_news_schema(list(user_ids) or None, dry_run=dry_run)
+    saved = stats['bytesBefore'] - stats['bytesAfter']
+    percent = 100 * saved / stats['bytesBefore'] if stats['bytesBefore'] else 0
+    click.echo(
+        f"{'Would migrate' if dry_run else 'Migrated'} {stats['migrated']} news items in "
+        f"{stats['categories']} categories ({stats['alreadyCurrent']} already v{NEWS_ITEM_SCHEMA_VERSION})"
+    )
+    click.echo(f"Stored size: {stats['bytesBefore']} -> {stats['bytesAfter']} bytes, {saved} saved ({percent:.1f}%)")
+
+# --- App Factory ---
+class NewsGeniusFlask(Flask):
+    """Flask app whose async views all run on the worker's shared event loop"""
+
+    def async_to_sync(self, func):
+        def run_on_shared_loop(*args, **kwargs):
+            return shared_loop.run(func(*args, **kwargs))
+        return run_on_shared_loop
+
+def create_app():
+    """
+    Build the Flask app. No clients are created here: Firebase, Gemini and the
+    storage backend initialize on first use, after any pre-fork server forks.
+    """
+    app = NewsGeniusFlask(__name__)
+
+    # Configure app with simple CORS - this is the ONLY place CORS headers should be set
+    # Using supports_credentials=True and not setting methods/headers to let Flask-CORS handle it all
+    CORS(app, origins=CORS_ALLOWED_ORIGINS, supports_credentials=True)
+
+    # Request latency histograms and the Prometheus /metrics endpoint
+    metrics.init_app(app)
+
+    app.register_blueprint(api)
+    app.cli.add_command(migrate_news_schema_command)
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     debug_mode = os.environ.get('DEBUG', 'False').lower() == 'true'
@@ -0,0 +1,94 @@
+"""
+Production ASGI entrypoint.
+
+Each worker process runs one event loop (the ASGI server's). WSGI request
+handling for the Flask app runs on a pool of request threads, and every async
+view and pipeline is scheduled onto that single loop (see shared_loop), so
+many category builds overlap on network I/O inside one process.
+
+    python asgi.py                                  # uvicorn, WEB_CONCURRENCY workers
+    uvicorn asgi:application --workers 4            # or any ASGI server
+    hypercorn asgi:application --workers 4
+"""
+import asyncio
+import logging
+import os
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+import shared_loop
+from app import create_app
+
+logger = logging.getLogger(__name__)
+
+# Requests being handled at once. Each in-flight request holds a thread while
+# its coroutine runs on the event loop; the rest wait here, so waiting requests
+# can never starve the blocking-I/O executor their own coroutines need.
+REQUEST_THREADS = int(os.environ.get('ASGI_REQUEST_THREADS', 100))
+
+_request_slots = None
+
+
+def _get_request_slots():
+    # Created on first use, inside the worker's running loop (on Python 3.9 a
+    # Semaphore binds to the loop current when it is created)
+    global _request_slots
+    if _request_slots is None:
+        _request_slots = asyncio.Semaphore(REQUEST_THREADS)
+    return _request_slots
+
+
+# WsgiToAsgiInstance.run_wsgi_app is not documented asgiref API; asgiref is
+# pinned in requirements.txt to the version this override is tested against.
+class _ConcurrentWsgiToAsgiInstance(WsgiToAsgiInstance):
+    async def run_wsgi_app(self, body):
+        # asgiref runs WSGI apps thread-sensitively, on one thread shared by
+        # every request; a ThreadSensitiveContext per request gives each its
+        # own thread, so requests are handled concurrently.
+        async with _get_request_slots(), ThreadSensitiveContext():
+            await super().run_wsgi_app(body)
+
+
+class ConcurrentWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await _ConcurrentWsgiToAsgiInstance(self.wsgi_application, self.duplicate_header_limit)(
+            scope, receive, send
+        )
+
+
+flask_app = create_app()
+_wsgi_app = ConcurrentWsgiToAsgi(flask_app)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            shared_loop.bind(asyncio.get_running_loop())
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    # Servers started without lifespan support bind on the first request
+    shared_loop.bind(asyncio.get_running_loop())
+    await _wsgi_app(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(
+        'asgi:application',
+        host='0.0.0.0',
+        port=int(os.environ.get('PORT', 8080)),
+        workers=int(os.environ.get('WEB_CONCURRENCY', 1)),
+        lifespan='on',
+        log_level='info',
+    )
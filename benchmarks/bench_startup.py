@@ -0,0 +1,65 @@
+"""
+Cold-start benchmark: time `import app` + create_app() in fresh interpreters.
+
+The "eager" scenario additionally imports the SDKs that app.py used to load
+at import time (firebase_admin/firestore, google.generativeai, bs4), which is
+what every worker paid before clients became lazy.
+
+    python benchmarks/bench_startup.py [--runs 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    'lazy (import app + create_app)': "import app; app.create_app()",
+    'eager (+ SDK imports at startup)': (
+        "import app; app.create_app(); "
+        "import firebase_admin; from firebase_admin import credentials, firestore; "
+        "import google.generativeai; import bs4"
+    ),
+}
+
+TIMER = (
+    "import time; _t = time.perf_counter(); {code}; "
+    "print(time.perf_counter() - _t)"
+)
+
+
+def time_scenario(code, runs):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-c', TIMER.format(code=code)],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+        )
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    # One throwaway run per scenario so .pyc files and the OS page cache are warm
+    for code in SCENARIOS.values():
+        time_scenario(code, 1)
+
+    results = {}
+    for name, code in SCENARIOS.items():
+        samples = time_scenario(code, args.runs)
+        results[name] = samples
+        print(f"{name:<36} median {statistics.median(samples) * 1000:8.1f} ms   min {min(samples) * 1000:8.1f} ms")
+
+    lazy, eager = (statistics.median(v) for v in results.values())
+    print(f"\nStartup saved by lazy initialization: {(eager - lazy) * 1000:.1f} ms per worker")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+Offline micro-benchmarks for the pure-CPU hot paths in app.py.
+
+Every benchmark runs against the checked-in corpora under benchmarks/fixtures,
+so no network access or API keys are needed.
+
+    python benchmarks/run_benchmarks.py                 # report only
+    python benchmarks/run_benchmarks.py --save          # record a baseline
+    python benchmarks/run_benchmarks.py --compare       # fail on regressions
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baselines', 'baseline.json')
+
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import app  # noqa: E402
+import image_probe  # noqa: E402
+import prompt_index  # noqa: E402
+import summarizer  # noqa: E402
+
+# The hot functions log at INFO on every call; keep that out of the timings.
+logging.disable(logging.CRITICAL)
+
+
+def _read(*parts, mode='r'):
+    with open(os.path.join(FIXTURES_DIR, *parts), mode) as f:
+        return f.read()
+
+
+def load_fixtures():
+    rss_small = _read('rss', 'google_news_small.xml', mode='rb')
+    rss_large = _read('rss', 'google_news_large.xml', mode='rb')
+    html_pages = {
+        name: _read('html', name)
+        for name in sorted(os.listdir(os.path.join(FIXTURES_DIR, 'html')))
+    }
+    image_urls = _read('image_urls.txt').splitlines()
+    image_headers = [
+        _read('images', name, mode='rb')
+        for name in sorted(os.listdir(os.path.join(FIXTURES_DIR, 'images')))
+    ]
+    rss_articles = app.parse_google_news_rss(rss_large)
+    google_links = [a['url'] for a in rss_articles]
+    return {
+        'rss_small': rss_small,
+        'rss_large': rss_large,
+        'html_pages': html_pages,
+        'image_urls': image_urls,
+        'image_headers': image_headers,
+        # Duplicated feed so remove_duplicates has real work to do
+        'articles': rss_articles + copy.deepcopy(rss_articles[::2]),
+        'google_links': google_links,
+    }
+
+
+def build_benchmarks(fx):
+    """Map benchmark name -> zero-argument callable doing one operation"""
+    def candidates_all_pages():
+        for name, html in fx['html_pages'].items():
+            app.extract_image_candidates(html, 'https://www.example-news.com/article')
+
+    def stream_first_ten():
+        chunks = (fx['rss_large'][i:i + app.RSS_CHUNK_SIZE]
+                  for i in range(0, len(fx['rss_large']), app.RSS_CHUNK_SIZE))
+        return list(app.iter_google_news_rss(chunks, limit=app.GOOGLE_RSS_MAX_ARTICLES))
+
+    def placeholder_all():
+        for article in fx['articles']:
+            app.get_contextual_placeholder_image(article['title'], article['description'])
+
+    # Every headline registered as a topic, then the headlines minus their
+    # first word canonicalized against them. A fresh index per run, so the
+    # near-duplicates are matched rather than found as already known.
+    near_prompts = [' '.join(article['title'].split()[1:]) for article in fx['articles']]
+
+    def canonicalize_near_prompts():
+        topic_index = prompt_index.PromptIndex()
+        for article in fx['articles']:
+            topic_index.canonicalize(article['title'])
+        for prompt in near_prompts:
+            topic_index.canonicalize(prompt)
+
+    return {
+        'parse_google_news_rss[small]': lambda: app.parse_google_news_rss(fx['rss_small']),
+        'parse_google_news_rss[large]': lambda: app.parse_google_news_rss(fx['rss_large']),
+        'iter_google_news_rss[large,limit=10]': stream_first_ten,
+        'decode_google_news_url_advanced': lambda: [
+            app.decode_google_news_url_advanced(link) for link in fx['google_links']
+        ],
+        'decode_google_news_urls': lambda: app.decode_google_news_urls(fx['google_links']),
+        'is_real_news_image': lambda: [app.is_real_news_image(u) for u in fx['image_urls']],
+        'remove_duplicates': lambda: app.remove_duplicates(fx['articles']),
+        'extract_image_candidates': candidates_all_pages,
+        'image_dimensions': lambda: [image_probe.image_dimensions(data) for data in fx['image_headers']],
+        'get_contextual_placeholder_image': placeholder_all,
+        'prompt_index_canonicalize': canonicalize_near_prompts,
+        'extractive_summary': lambda: [
+            summarizer.extractive_summary(a['title'], a['description'], a.get('content')) for a in fx['articles']
+        ],
+    }
+
+
+def measure(func, min_time, repeat):
+    """Return ops/sec (best of `repeat` rounds) and peak bytes allocated per op"""
+    func()  # warm-up
+
+    # Calibrate a loop count that runs for at least min_time
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'ops_per_sec': loops / best,
+        'peak_alloc_bytes': peak,
+    }
+
+
+def run(names=None, min_time=0.2, repeat=5):
+    fx = load_fixtures()
+    benchmarks = build_benchmarks(fx)
+    results = {}
+    for name, func in benchmarks.items():
+        if names and not any(n in name for n in names):
+            continue
+        results[name] = measure(func, min_time, repeat)
+        r = results[name]
+        print(f"{name:<40} {r['ops_per_sec']:>12.1f} ops/s {r['peak_alloc_bytes'] / 1024:>10.1f} KiB peak")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the list of regressions beyond `tolerance` (fraction)"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        speed = current['ops_per_sec'] / base['ops_per_sec']
+        memory = current['peak_alloc_bytes'] / max(base['peak_alloc_bytes'], 1)
+        status = 'ok'
+        if speed < 1 - tolerance:
+            status = 'SLOWER'
+            regressions.append(name)
+        elif memory > 1 + tolerance:
+            status = 'MORE MEMORY'
+            regressions.append(name)
+        print(f"{name:<40} speed x{speed:.2f}  memory x{memory:.2f}  {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', dest='names', action='append', help='only run benchmarks whose name contains this')
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds per timing round')
+    parser.add_argument('--repeat', type=int, default=5, help='timing rounds (best is kept)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file')
+    parser.add_argument('--save', action='store_true', help='write results as the new baseline')
+    parser.add_argument('--compare', action='store_true', help='compare against the baseline and fail on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown/memory growth (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    results = run(args.names, args.min_time, args.repeat)
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save first")
+            return 2
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        print()
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+            return 1
+        print("\n✅ No regressions")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Circuit breaker for an upstream service.
+
+After `failure_threshold` consecutive failures (errors, timeouts, quota
+rejections) the circuit opens and callers skip the upstream for
+`reset_after` seconds. Then a single trial call is let through (half-open):
+success closes the circuit, failure opens it again.
+
+allow() hands each call a token that the call passes back with its outcome,
+so only the trial call itself can release or fail the trial.
+"""
+import threading
+import time
+
+from metrics import set_circuit_open
+
+
+class CircuitOpenError(Exception):
+    """The upstream is being skipped because its circuit is open"""
+
+
+# Token of calls let through while the circuit is closed
+CLOSED = object()
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open)"""
+
+    def __init__(self, name, failure_threshold=5, reset_after=30, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._trial = None  # token of the half-open trial call in flight
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        """True while calls are being skipped (open and not yet due for a trial)"""
+        with self._lock:
+            return self._opened_at is not None and (
+                self._trial is not None or self._clock() - self._opened_at < self.reset_after
+            )
+
+    def allow(self):
+        """
+        A token if a call may go ahead now (claiming the trial call when
+        half-open), None if it must be skipped
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return CLOSED
+            if self._trial is not None or self._clock() - self._opened_at < self.reset_after:
+                return None
+            self._trial = object()
+            return self._trial
+
+    def release(self, token):
+        """Give back a call abandoned without an outcome (frees the trial if it was the trial)"""
+        with self._lock:
+            if token is self._trial:
+                self._trial = None
+
+    def record_success(self, token=None):
+        with self._lock:
+            was_open = self._opened_at is not None
+            self._failures = 0
+            self._opened_at = None
+            self._trial = None
+        if was_open:
+            set_circuit_open(self.name, False)
+
+    def record_failure(self, token=None):
+        with self._lock:
+            self._failures += 1
+            trial_failed = token is not None and token is self._trial
+            opening = trial_failed or (
+                self._opened_at is None and self._failures >= self.failure_threshold
+            )
+            if opening:
+                self._opened_at = self._clock()
+                self._trial = None
+        if opening:
+            set_circuit_open(self.name, True)
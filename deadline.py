@@ -0,0 +1,86 @@
+"""
+Wall-clock budgets for multi-step network chains.
+
+A Deadline is created once per unit of work (e.g. resolving one article's
+image) and passed down through every stage. Each network call gets
+min(its own timeout, remaining budget), and blocking calls are abandoned when
+the budget runs out rather than when their per-socket timeout fires, so one
+slow upstream cannot hold up the whole chain.
+"""
+import asyncio
+import time
+
+from metrics import record_deadline_exceeded
+
+# Below this much remaining budget a network call is not worth starting
+MIN_CALL_SECONDS = 0.25
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage has no budget left (counted per stage)"""
+
+    def __init__(self, stage):
+        super().__init__(f"Deadline exceeded in stage '{stage}'")
+        self.stage = stage
+
+
+class Deadline:
+    """A monotonic-clock budget shared by every stage of one chain"""
+
+    def __init__(self, seconds, clock=time.monotonic):
+        self._clock = clock
+        self.seconds = seconds
+        self.expires_at = clock() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self):
+        return self.remaining() < MIN_CALL_SECONDS
+
+    def check(self, stage):
+        """Raise DeadlineExceeded (and count it) if `stage` cannot start"""
+        if self.expired:
+            record_deadline_exceeded(stage)
+            raise DeadlineExceeded(stage)
+
+    def timeout(self, stage, cap):
+        """The timeout for a call in `stage`: min(cap, remaining budget)"""
+        self.check(stage)
+        return min(cap, self.remaining())
+
+    async def run_blocking(self, stage, func, *args, timeout, **kwargs):
+        """
+        Run a blocking call that accepts `timeout=` in a thread, within budget.
+
+        The call receives the budgeted timeout and is additionally abandoned
+        (its thread finishes in the background) once the budget is spent,
+        since requests' timeouts are per socket operation, not per call.
+        """
+        budget = self.timeout(stage, timeout)
+        try:
+            return await asyncio.wait_for(
+                asyncio.to_thread(func, *args, timeout=budget, **kwargs), budget
+            )
+        except asyncio.TimeoutError:
+            if self.expired:
+                record_deadline_exceeded(stage)
+                raise DeadlineExceeded(stage) from None
+            raise
+
+    async def wait(self, stage, awaitable):
+        """
+        Await `awaitable` within the remaining budget, cancelling it when the
+        budget runs out; raises DeadlineExceeded (counted) if it does
+        """
+        if self.expired:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            record_deadline_exceeded(stage)
+            raise DeadlineExceeded(stage)
+        try:
+            return await asyncio.wait_for(awaitable, self.remaining())
+        except asyncio.TimeoutError:
+            record_deadline_exceeded(stage)
+            raise DeadlineExceeded(stage) from None
@@ -0,0 +1,133 @@
+"""
+Background deletion of categories and their news items.
+
+DELETE only marks the category as deleted (it disappears from every read) and
+records a deletion job in storage. CategoryDeleter then lists news item ids in
+rounds of chunk_size * parallelism, deletes the chunks as parallel batch
+writes, records progress on the job after every round and finally removes the
+category document together with the job.
+
+A job that fails is retried on this worker with exponential backoff
+(retry_delay doubling up to max_retry_delay). Jobs live in storage, so a
+crash or redeploy never leaves orphaned news items either: resume() restarts
+every job whose progress has not moved for stale_after seconds, at startup and
+then every resume_interval seconds. Deletes are idempotent, so a job that runs
+twice is harmless.
+"""
+import concurrent.futures
+import datetime
+import logging
+import threading
+import time
+
+from metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+
+class CategoryDeleter:
+    """Runs category deletion jobs on background threads"""
+
+    def __init__(self, repository, chunk_size=500, parallelism=4, max_jobs=2, stale_after=60,
+                 retry_delay=5, max_retry_delay=300, resume_interval=300):
+        self._repository = repository
+        self.chunk_size = chunk_size
+        self.parallelism = parallelism
+        self.stale_after = stale_after
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.resume_interval = resume_interval
+        self._failures = {}  # job id -> consecutive failed runs
+        self._jobs = concurrent.futures.ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix='category-deleter')
+        self._chunks = concurrent.futures.ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix='category-delete-chunk')
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def delete(self, user_id, category_id):
+        """Mark a category deleted and start removing it; return the job or None if missing"""
+        job = self._repository.mark_category_deleted(user_id, category_id)
+        if job is not None:
+            self._submit(job)
+        return job
+
+    def resume(self):
+        """Restart stale unfinished jobs (e.g. left behind by a crashed worker)"""
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.stale_after)
+        resumed = 0
+        for job in self._repository.list_category_deletions():
+            updated_at = job.get('updatedAt')
+            if updated_at is None or updated_at <= cutoff:
+                resumed += self._submit(job)
+        if resumed:
+            logger.info(f"♻️ Resumed {resumed} unfinished category deletions")
+        return resumed
+
+    def schedule_resume(self):
+        """Run resume() on the job pool now and then every resume_interval seconds"""
+        self._jobs.submit(self._resume_logged)
+        if self.resume_interval:
+            threading.Thread(target=self._resume_periodically, name='category-deleter-resume', daemon=True).start()
+
+    def _resume_periodically(self):
+        while True:
+            time.sleep(self.resume_interval)
+            self._resume_logged()
+
+    def _resume_logged(self):
+        try:
+            self.resume()
+        except Exception as e:
+            logger.error(f"Resuming category deletions failed: {e}")
+
+    def _submit(self, job):
+        with self._lock:
+            if job['id'] in self._running:
+                return False
+            self._running.add(job['id'])
+        self._jobs.submit(self._run_logged, job)
+        return True
+
+    def _run_logged(self, job):
+        try:
+            self.run(job)
+        except Exception as e:
+            with self._lock:
+                failures = self._failures[job['id']] = self._failures.get(job['id'], 0) + 1
+            delay = min(self.max_retry_delay, self.retry_delay * 2 ** (failures - 1))
+            logger.error(
+                f"❌ Category deletion {job['id']} failed after {job.get('deletedNewsItems', 0)} items; "
+                f"retrying in {delay:g}s: {e}"
+            )
+            retry = threading.Timer(delay, self._submit, args=(job,))
+            retry.daemon = True
+            retry.start()
+        else:
+            with self._lock:
+                self._failures.pop(job['id'], None)
+        finally:
+            with self._lock:
+                self._running.discard(job['id'])
+
+    def run(self, job):
+        """Delete a job's news items in parallel chunks, then the category and the job"""
+        user_id, category_id = job['userId'], job['categoryId']
+        deleted = job.get('deletedNewsItems', 0)
+
+        with stage_timer('delete_category'):
+            while True:
+                item_ids = self._repository.list_news_item_ids(
+                    user_id, category_id, self.chunk_size * self.parallelism
+                )
+                if not item_ids:
+                    break
+                chunks = [item_ids[i:i + self.chunk_size] for i in range(0, len(item_ids), self.chunk_size)]
+                deleted += sum(self._chunks.map(
+                    lambda chunk: self._repository.delete_news_items(user_id, category_id, chunk), chunks
+                ))
+                job['deletedNewsItems'] = deleted
+                self._repository.update_category_deletion(job['id'], deleted)
+                logger.info(f"🗑️ Category {category_id}: {deleted} news items deleted so far")
+
+            self._repository.finish_category_deletion(job)
+        logger.info(f"✅ Deleted category {category_id} and {deleted} news items for user {user_id}")
+        return deleted
@@ -0,0 +1,83 @@
+"""
+Replayable event logs for streamed refreshes.
+
+A refresh appends its events to an EventLog (from the shared event loop) and
+any number of SSE responses read it (from request threads). Events are
+numbered from 1 like SSE ids, so a client that reconnects with Last-Event-ID
+gets exactly the events it missed instead of starting another refresh. A
+finished log is kept for `retain` seconds so a reconnect right after the end
+still sees the final event.
+"""
+import threading
+import time
+
+
+class EventLog:
+    """Append-only, thread-safe list of (event, data) with blocking reads"""
+
+    def __init__(self):
+        self._events = []
+        self._condition = threading.Condition()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    @property
+    def last_id(self):
+        return len(self._events)
+
+    def append(self, event, data):
+        with self._condition:
+            self._events.append((event, data))
+            self._condition.notify_all()
+            return len(self._events)
+
+    def finish(self):
+        with self._condition:
+            self.finished_at = time.monotonic()
+            self._condition.notify_all()
+
+    def read(self, after_id, timeout):
+        """
+        Events numbered above `after_id` as [(id, event, data)], waiting up to
+        `timeout` seconds for one; [] on timeout or when the log has finished
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.last_id > after_id or self.finished, timeout)
+            return [
+                (event_id, event, data)
+                for event_id, (event, data) in enumerate(self._events[after_id:], start=after_id + 1)
+            ]
+
+
+class EventLogs:
+    """Event logs by key, at most one unfinished per key"""
+
+    def __init__(self, retain=60):
+        self.retain = retain
+        self._logs = {}
+        self._lock = threading.Lock()
+
+    def _purge(self):
+        now = time.monotonic()
+        for key, log in list(self._logs.items()):
+            if log.finished and now - log.finished_at > self.retain:
+                del self._logs[key]
+
+    def get(self, key):
+        """The running or recently finished log for `key`, or None"""
+        with self._lock:
+            self._purge()
+            return self._logs.get(key)
+
+    def start(self, key):
+        """(log, created): the unfinished log for `key`, or a new one replacing a finished one"""
+        with self._lock:
+            self._purge()
+            log = self._logs.get(key)
+            if log is not None and not log.finished:
+                return log, False
+            log = self._logs[key] = EventLog()
+            return log, True
@@ -0,0 +1,80 @@
+"""
+Async access to the Gemini model.
+
+Every Gemini call in the pipeline goes through AsyncGemini.generate(), which
+uses the SDK's native async API (generate_content_async, a gRPC aio call on
+the worker's event loop) so LLM calls overlap with each other and with HTTP
+fetching without holding a thread each. Models without the async API fall
+back to the blocking call in an executor thread.
+
+Calls are capped at max_concurrency in flight per worker (the rest wait their
+turn, which is not counted as upstream latency) and each is cancelled after
+its timeout. With a circuit breaker, failing calls open the circuit and calls
+made while it is open raise CircuitOpenError without reaching Gemini, so
+callers fall back at once.
+"""
+import asyncio
+
+from circuit_breaker import CircuitOpenError
+from metrics import track_upstream
+
+
+class AsyncGemini:
+    """Concurrency-capped, time-limited async wrapper around a GenerativeModel"""
+
+    def __init__(self, model, max_concurrency=8, timeout=30, breaker=None):
+        self._model = model
+        self.timeout = timeout
+        self.breaker = breaker
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queued = 0
+
+    @property
+    def queued(self):
+        """Calls waiting for a free slot (a load signal for optional calls)"""
+        return self._queued
+
+    async def _call(self, prompt, config):
+        if hasattr(self._model, 'generate_content_async'):
+            return await self._model.generate_content_async(prompt, generation_config=config)
+        return await asyncio.to_thread(self._model.generate_content, prompt, generation_config=config)
+
+    async def generate(self, prompt, timeout=None, **generation_config):
+        """
+        Response text for `prompt`; keyword arguments build the GenerationConfig.
+        Raises TimeoutError when the call takes longer than `timeout` seconds
+        and CircuitOpenError while the breaker is open.
+        """
+        import google.generativeai as genai
+
+        token = self.breaker.allow() if self.breaker is not None else None
+        if self.breaker is not None and token is None:
+            raise CircuitOpenError("Gemini circuit is open")
+        config = genai.GenerationConfig(**generation_config)
+        timeout = timeout or self.timeout
+        try:
+            self._queued += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self._queued -= 1
+            try:
+                with track_upstream('gemini'):
+                    try:
+                        response = await asyncio.wait_for(self._call(prompt, config), timeout)
+                    except asyncio.TimeoutError:
+                        raise TimeoutError(f"Gemini call timed out after {timeout:g}s") from None
+            finally:
+                self._semaphore.release()
+        except asyncio.CancelledError:
+            # Cancelled by the caller (e.g. its deadline): says nothing about Gemini
+            if self.breaker is not None:
+                self.breaker.release(token)
+            raise
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.record_failure(token)
+            raise
+        if self.breaker is not None:
+            self.breaker.record_success(token)
+        return response.text
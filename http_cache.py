@@ -0,0 +1,91 @@
+"""
+HTTP conditional requests (ETag / Last-Modified) with parsed-result reuse.
+
+For every URL fetched through conditional_get we remember the validators the
+server sent together with the *parsed* result of that response. The next fetch
+sends If-None-Match / If-Modified-Since; on 304 Not Modified the stored result
+is returned without downloading or parsing the body again.
+"""
+import copy
+import threading
+from collections import OrderedDict
+
+import requests
+
+from metrics import record_cache, track_upstream
+
+
+class ValidatorCache:
+    """Thread-safe LRU of cache key -> (ETag, Last-Modified, parsed result)"""
+
+    def __init__(self, max_entries=1000):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def store(self, key, etag, last_modified, result):
+        with self._lock:
+            self._entries[key] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'result': result,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def conditional_get(cache, upstream, url, parse, cache_key=None, headers=None, **request_kwargs):
+    """
+    GET `url` with the stored validators and return parse(response).
+
+    On 304 the previously parsed result is returned (as a deep copy, since
+    callers enrich article dicts in place). `parse` runs while the response is
+    open, so it may stream and stop early. Validators are only stored for
+    responses that carry them; `cache_key` distinguishes different parses of
+    the same URL.
+    """
+    key = cache_key or url
+    entry = cache.get(key)
+    request_headers = dict(headers or {})
+    if entry is not None:
+        if entry['etag']:
+            request_headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            request_headers['If-Modified-Since'] = entry['last_modified']
+
+    with track_upstream(upstream) as call:
+        response = requests.get(url, headers=request_headers, **request_kwargs)
+        try:
+            if response.status_code == 304 and entry is not None:
+                call.outcome = 'not_modified'
+                record_cache(f'{upstream}_conditional', True)
+                return copy.deepcopy(entry['result'])
+
+            record_cache(f'{upstream}_conditional', False)
+            response.raise_for_status()
+            result = parse(response)
+        finally:
+            response.close()
+
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if etag or last_modified:
+        cache.store(key, etag, last_modified, copy.deepcopy(result))
+    elif entry is not None:
+        cache.discard(key)
+    return result
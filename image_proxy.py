@@ -0,0 +1,260 @@
+"""
+Image proxy with a resized thumbnail cache on local disk.
+
+Source images (publisher CDNs, Pexels, Unsplash) are served from
+/img/<signature>/<encoded source URL>: the proxy URL carries its own source,
+signed with an HMAC of IMAGE_PROXY_SECRET, so it stays valid on every
+instance and across redeploys, and nobody can make the proxy fetch URLs the
+app did not sign. Sources are cached under the sha256 digest of their URL.
+The first request downloads the source once; each (width, format) thumbnail
+is rendered from that copy on first use. Everything under a digest is
+immutable, so responses can be cached by browsers and CDNs for a year.
+
+Sources are only fetched from public addresses: the host (and that of every
+redirect) is resolved first and private, loopback, link-local, reserved and
+cloud metadata addresses are refused. The request then connects to the
+address that was checked (HTTPS still verifies the certificate against the
+host name), so a DNS answer changing in between cannot redirect it.
+
+Layout: <root>/<digest[:2]>/<digest>/{original, <width>.<webp|jpeg>}
+"""
+import base64
+import hashlib
+import hmac
+import io
+import ipaddress
+import logging
+import os
+import socket
+import tempfile
+import threading
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import record_cache, track_upstream
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+
+class ImageProxyError(Exception):
+    """The source image is unknown, unreachable or not a decodable image"""
+
+
+MAX_REDIRECTS = 3
+
+
+def url_digest(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+
+def _signature(url, secret):
+    return hmac.new(secret.encode('utf-8'), url.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+
+def signed_path(url, secret):
+    """'<signature>/<encoded url>' for a proxy URL of `url`"""
+    encoded = base64.urlsafe_b64encode(url.encode('utf-8')).decode('ascii').rstrip('=')
+    return f"{_signature(url, secret)}/{encoded}"
+
+
+def verify_signed_path(signature, encoded, secret):
+    """The source URL of a signed proxy path; raises ImageProxyError if it was not signed with `secret`"""
+    try:
+        url = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)).decode('utf-8')
+    except (ValueError, UnicodeDecodeError):
+        raise ImageProxyError("Malformed image URL")
+    if not secret or not hmac.compare_digest(_signature(url, secret), signature):
+        raise ImageProxyError("Invalid image signature")
+    return url
+
+
+def check_public_url(url):
+    """
+    Raise ImageProxyError unless `url` is http(s) and its host resolves only
+    to public addresses; returns the first of them to connect to
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ImageProxyError("Only http(s) image URLs can be proxied")
+    try:
+        infos = socket.getaddrinfo(parsed.hostname, parsed.port or 443, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError) as e:
+        raise ImageProxyError(f"Cannot resolve image host: {e}")
+    for info in infos:
+        address = _address(info)
+        # is_global excludes private, loopback, link-local (incl. 169.254.169.254
+        # metadata), shared, reserved and unspecified ranges
+        if not address.is_global or address.is_multicast:
+            raise ImageProxyError(f"Image host {parsed.hostname} resolves to a non-public address")
+    return str(_address(infos[0]))
+
+
+def _address(info):
+    address = ipaddress.ip_address(info[4][0].split('%')[0])
+    if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+        return address.ipv4_mapped
+    return address
+
+
+class _PinnedHostAdapter(HTTPAdapter):
+    """HTTPS to an IP address while SNI and certificate checks use `hostname`"""
+
+    def __init__(self, hostname):
+        self._hostname = hostname
+        super().__init__()
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['server_hostname'] = self._hostname
+        kwargs['assert_hostname'] = self._hostname
+        super().init_poolmanager(*args, **kwargs)
+
+
+def _bracketed(host):
+    return f'[{host}]' if ':' in host else host
+
+
+def pinned_get(url, address, **kwargs):
+    """requests.get(url) over a connection to `address` instead of a fresh DNS lookup of the host"""
+    parsed = urlparse(url)
+    host = _bracketed(parsed.hostname)
+    port = '' if parsed.port is None else f':{parsed.port}'
+    session = requests.Session()
+    # An environment proxy would resolve the host name again itself
+    session.trust_env = False
+    session.mount('https://', _PinnedHostAdapter(parsed.hostname))
+    headers = {**kwargs.pop('headers', {}), 'Host': host + port}
+    return session.get(
+        parsed._replace(netloc=_bracketed(address) + port).geturl(), headers=headers, **kwargs
+    )
+
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class ThumbnailCache:
+    """Content-addressed disk cache of source images and their fixed-width thumbnails"""
+
+    def __init__(self, root, widths=(320, 640), max_source_bytes=10 * 1024 * 1024, timeout=10):
+        self.root = root
+        self.widths = tuple(sorted(widths))
+        self.max_source_bytes = max_source_bytes
+        self.timeout = timeout
+        # Striped per-digest locks so concurrent misses download a source once
+        self._locks = [threading.Lock() for _ in range(64)]
+
+    def _dir(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _lock(self, digest):
+        return self._locks[int(digest[:4], 16) % len(self._locks)]
+
+    def snap_width(self, width):
+        """Nearest configured width at or above `width` (the largest if none is)"""
+        for candidate in self.widths:
+            if width <= candidate:
+                return candidate
+        return self.widths[-1]
+
+    def _get(self, url):
+        """GET `url` following redirects, checking every hop is a public address"""
+        for _ in range(MAX_REDIRECTS + 1):
+            address = check_public_url(url)
+            response = pinned_get(
+                url, address, headers={'User-Agent': USER_AGENT}, timeout=self.timeout, stream=True,
+                allow_redirects=False
+            )
+            if not response.is_redirect:
+                return response
+            response.close()
+            url = urljoin(url, response.headers['Location'])
+        raise ImageProxyError("Too many redirects")
+
+    def _download(self, url):
+        with track_upstream('image_proxy_source') as call:
+            try:
+                response = self._get(url)
+            except ImageProxyError:
+                call.outcome = 'error'
+                raise
+            try:
+                if response.status_code != 200:
+                    call.outcome = 'http_error'
+                    raise ImageProxyError(f"Source returned HTTP {response.status_code}")
+                if not response.headers.get('Content-Type', 'image/').startswith('image/'):
+                    call.outcome = 'error'
+                    raise ImageProxyError("Source is not an image")
+                body = bytearray()
+                for chunk in response.iter_content(64 * 1024):
+                    body.extend(chunk)
+                    if len(body) > self.max_source_bytes:
+                        call.outcome = 'error'
+                        raise ImageProxyError("Source image too large")
+                return bytes(body)
+            finally:
+                response.close()
+
+    def _original(self, digest, url):
+        path = os.path.join(self._dir(digest), 'original')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+        data = self._download(url)
+        os.makedirs(self._dir(digest), exist_ok=True)
+        _write_atomic(path, data)
+        return data
+
+    @staticmethod
+    def _render(data, width, fmt):
+        from PIL import Image, ImageOps
+
+        try:
+            image = Image.open(io.BytesIO(data))
+            image = ImageOps.exif_transpose(image)
+        except Exception as e:
+            raise ImageProxyError(f"Undecodable image: {e}")
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        image = image.convert('RGBA' if fmt == 'webp' and image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+        out = io.BytesIO()
+        if fmt == 'webp':
+            image.save(out, 'WEBP', quality=80, method=4)
+        else:
+            image.save(out, 'JPEG', quality=82, optimize=True, progressive=True)
+        return out.getvalue()
+
+    def thumbnail(self, url, width, fmt):
+        """
+        Path of the `fmt` thumbnail of the image at `url` at a configured
+        width, creating it (and downloading the source) on first use
+        """
+        digest = url_digest(url)
+        width = self.snap_width(width)
+        path = os.path.join(self._dir(digest), f'{width}.{fmt}')
+        if os.path.exists(path):
+            record_cache('image_proxy', True)
+            return path
+        record_cache('image_proxy', False)
+
+        with self._lock(digest):
+            if not os.path.exists(path):
+                _write_atomic(path, self._render(self._original(digest, url), width, fmt))
+                logger.info(f"🖼️ Rendered {width}px {fmt} thumbnail for {digest}")
+        return path
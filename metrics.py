@@ -0,0 +1,240 @@
+"""
+Prometheus metrics for the NewsGenius pipeline and API endpoints.
+
+Stage latencies, upstream call outcomes, cache hit/miss counts and in-flight
+pipeline gauges are recorded here and exposed at /metrics in the Prometheus
+text format. When PROMETHEUS_MULTIPROC_DIR is set (multi-worker servers) the
+endpoint aggregates the per-process files instead of the local registry.
+"""
+import asyncio
+import functools
+import os
+import time
+from contextlib import contextmanager
+
+import requests
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# Pipeline stages run from tens of milliseconds (dedupe) to a minute (a full
+# category build), so the buckets span both ends.
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    'newsgenius_pipeline_stage_seconds',
+    'Time spent in each news pipeline stage',
+    ['stage'],
+    buckets=STAGE_BUCKETS,
+)
+
+UPSTREAM_CALLS_TOTAL = Counter(
+    'newsgenius_upstream_calls_total',
+    'Calls to upstream services by outcome',
+    ['upstream', 'outcome'],
+)
+
+UPSTREAM_CALL_SECONDS = Histogram(
+    'newsgenius_upstream_call_seconds',
+    'Latency of upstream service calls',
+    ['upstream'],
+    buckets=STAGE_BUCKETS,
+)
+
+CACHE_REQUESTS_TOTAL = Counter(
+    'newsgenius_cache_requests_total',
+    'Cache lookups by result (hit/miss)',
+    ['cache', 'result'],
+)
+
+PIPELINES_IN_FLIGHT = Gauge(
+    'newsgenius_pipelines_in_flight',
+    'News pipelines currently running',
+    ['pipeline'],
+    multiprocess_mode='livesum',
+)
+
+GOOGLE_NEWS_DECODE_TOTAL = Counter(
+    'newsgenius_google_news_decode_total',
+    'Google News link resolutions by method (protobuf/legacy offline, network fallback, failed)',
+    ['method'],
+)
+
+DEADLINE_EXCEEDED_TOTAL = Counter(
+    'newsgenius_deadline_exceeded_total',
+    'Stages cut short or skipped because their chain ran out of budget',
+    ['stage'],
+)
+
+ENHANCEMENT_TIER_TOTAL = Counter(
+    'newsgenius_enhancement_tier_total',
+    'Article summaries by how they were produced (llm, original, extractive)',
+    ['tier'],
+)
+
+CIRCUIT_OPEN = Gauge(
+    'newsgenius_circuit_open',
+    'Whether an upstream circuit breaker is open (1) or closed/half-open (0)',
+    ['upstream'],
+    multiprocess_mode='max',
+)
+
+ADMISSION_TOTAL = Counter(
+    'newsgenius_admission_total',
+    'Pipeline requests admitted at once, admitted after queueing, or rejected with 429',
+    ['endpoint', 'result'],
+)
+
+SINGLE_FLIGHT_TOTAL = Counter(
+    'newsgenius_single_flight_total',
+    'Coalescable calls that started the computation (leader) or joined one in flight (joined)',
+    ['flight', 'result'],
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'newsgenius_http_request_seconds',
+    'API request latency by endpoint',
+    ['endpoint', 'method', 'status'],
+    buckets=STAGE_BUCKETS,
+)
+
+
+@contextmanager
+def stage_timer(stage):
+    """Record the duration of a pipeline stage (usable around awaits)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PIPELINE_STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def timed_stage(stage):
+    """Decorator recording every call of a coroutine function as `stage`"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class UpstreamCall:
+    """Outcome holder for track_upstream; callers may override `outcome`"""
+
+    def __init__(self):
+        self.outcome = 'ok'
+
+
+@contextmanager
+def track_upstream(upstream):
+    """
+    Count an upstream call by outcome and record its latency.
+
+    Timeouts and other exceptions are classified automatically and re-raised;
+    a caller that handles a bad response itself can set `call.outcome`.
+    """
+    call = UpstreamCall()
+    start = time.perf_counter()
+    try:
+        yield call
+    except (requests.Timeout, asyncio.TimeoutError, TimeoutError):
+        call.outcome = 'timeout'
+        raise
+    except requests.HTTPError:
+        call.outcome = 'http_error'
+        raise
+    except Exception:
+        call.outcome = 'error'
+        raise
+    finally:
+        UPSTREAM_CALL_SECONDS.labels(upstream=upstream).observe(time.perf_counter() - start)
+        UPSTREAM_CALLS_TOTAL.labels(upstream=upstream, outcome=call.outcome).inc()
+
+
+def record_cache(cache, hit):
+    """Count a cache lookup as a hit or a miss"""
+    CACHE_REQUESTS_TOTAL.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def record_google_news_decode(method):
+    """Count how a Google News link was resolved"""
+    GOOGLE_NEWS_DECODE_TOTAL.labels(method=method).inc()
+
+
+def record_deadline_exceeded(stage):
+    """Count a stage that ran out of deadline budget"""
+    DEADLINE_EXCEEDED_TOTAL.labels(stage=stage).inc()
+
+
+def record_enhancement_tier(tier):
+    """Count an article summary by the tier that produced it"""
+    ENHANCEMENT_TIER_TOTAL.labels(tier=tier).inc()
+
+
+def record_admission(endpoint, result):
+    """Count an admission decision (admitted, queued or rejected)"""
+    ADMISSION_TOTAL.labels(endpoint=endpoint, result=result).inc()
+
+
+def record_single_flight(flight, joined):
+    """Count a coalescable call as leading its computation or joining one"""
+    SINGLE_FLIGHT_TOTAL.labels(flight=flight, result='joined' if joined else 'leader').inc()
+
+
+def set_circuit_open(upstream, is_open):
+    CIRCUIT_OPEN.labels(upstream=upstream).set(1 if is_open else 0)
+
+
+@contextmanager
+def pipeline_in_flight(pipeline):
+    """Track a running pipeline in the in-flight gauge"""
+    gauge = PIPELINES_IN_FLIGHT.labels(pipeline=pipeline)
+    gauge.inc()
+    try:
+        yield
+    finally:
+        gauge.dec()
+
+
+def _collect():
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not multiproc_dir:
+        return generate_latest(REGISTRY)
+
+    from prometheus_client import multiprocess
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=multiproc_dir)
+    return generate_latest(registry)
+
+
+def init_app(app):
+    """Time every request and expose /metrics on the Flask app"""
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_start_time = time.perf_counter()
+
+    @app.after_request
+    def _record_request_latency(response):
+        start = g.pop('request_start_time', None)
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_REQUEST_SECONDS.labels(
+                endpoint=endpoint,
+                method=request.method,
+                status=str(response.status_code),
+            ).observe(time.perf_counter() - start)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(_collect(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,158 @@
+"""
+Fuzzy canonicalization of user prompts.
+
+"AI", "A.I. news", "artificial intelligence" and "Artificial-Intelligence"
+should share one keyword cache entry. PromptIndex normalizes a prompt
+(case, punctuation, filler words like "news", plurals, an alias table for
+acronyms) and then maps it to the most similar known topic that is about the
+same thing; otherwise the prompt starts a new topic.
+
+Two prompts are about the same thing only when every content word of each
+has a counterpart in the other: the same word, or a near spelling ("india" /
+"indian", "artifical" / "artificial") by character trigram similarity. A
+broader or narrower topic never matches ("AI regulation" is not "AI", "Indian
+stock market" is not "stock market"), since whichever arrived first would
+otherwise hand its keywords to the other. Among such topics the one with the
+highest trigram Jaccard similarity of the normalized text wins. An inverted
+trigram index keeps lookups to topics sharing trigrams with the prompt, and
+topics whose numbers differ ("world cup 2022" / "world cup 2026") never match.
+"""
+import functools
+import re
+import threading
+from collections import Counter, OrderedDict
+
+DEFAULT_ALIASES = {
+    'ai': 'artificial intelligence',
+    'genai': 'generative artificial intelligence',
+    'ml': 'machine learning',
+    'llm': 'large language model',
+    'ev': 'electric vehicle',
+    'evs': 'electric vehicle',
+    'crypto': 'cryptocurrency',
+    'us': 'united states',
+    'usa': 'united states',
+    'uk': 'united kingdom',
+    'eu': 'european union',
+    'f1': 'formula one',
+    'nfl': 'national football league',
+    'nba': 'national basketball association',
+    'ipl': 'indian premier league',
+}
+
+# Words that do not change what a news prompt is about
+FILLER_WORDS = {
+    'news', 'latest', 'breaking', 'update', 'updates', 'today', 'headlines', 'top',
+    'the', 'a', 'an', 'of', 'in', 'on', 'about', 'and', 'for', 'to', 'from', 'with',
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def _singular(token):
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def _numbers(tokens):
+    return {token for token in tokens if any(ch.isdigit() for ch in token)}
+
+
+def trigrams(text):
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+@functools.lru_cache(maxsize=20000)
+def _token_trigrams(token):
+    return frozenset(trigrams(token))
+
+
+def _covered(tokens, other_tokens, threshold):
+    """Whether every token has an equal or near-spelled counterpart among other_tokens"""
+    others = other_tokens - tokens
+    for token in tokens - other_tokens:
+        grams = _token_trigrams(token)
+        if not any(_jaccard(grams, _token_trigrams(other)) >= threshold for other in others):
+            return False
+    return True
+
+
+class PromptIndex:
+    """Maps prompts to canonical topic keys; bounded LRU of known topics"""
+
+    def __init__(self, threshold=0.55, max_topics=5000, aliases=None):
+        # Trigram similarity at which two words count as the same word
+        self.threshold = threshold
+        self.max_topics = max_topics
+        self.aliases = dict(DEFAULT_ALIASES if aliases is None else aliases)
+        # canonical key -> (trigram set, token set)
+        self._topics = OrderedDict()
+        self._postings = {}
+        self._lock = threading.Lock()
+
+    def normalize(self, prompt):
+        """Order-insensitive normalized text of a prompt ('' if nothing is left)"""
+        # "A.I." -> "AI" before other punctuation becomes a separator
+        text = (prompt or '').lower().replace('.', '')
+        text = _PUNCTUATION.sub(' ', text).replace('_', ' ')
+        tokens = []
+        for token in text.split():
+            tokens.extend(self.aliases.get(token, token).split())
+        tokens = {_singular(token) for token in tokens if token not in FILLER_WORDS}
+        if not tokens:
+            # A prompt made only of filler words ("latest news") is its own topic
+            tokens = set(text.split())
+        return ' '.join(sorted(tokens))
+
+    def canonicalize(self, prompt):
+        """Canonical topic key for `prompt`, registering a new topic when none is similar enough"""
+        key = self.normalize(prompt)
+        with self._lock:
+            if key in self._topics:
+                self._topics.move_to_end(key)
+                return key
+            match = self._best_match(key)
+            if match is not None:
+                self._topics.move_to_end(match)
+                return match
+            self._add(key)
+            return key
+
+    def _best_match(self, key):
+        # Caller holds the lock
+        grams = trigrams(key)
+        shared = Counter(topic for gram in grams for topic in self._postings.get(gram, ()))
+        tokens = set(key.split())
+        numbers = _numbers(tokens)
+        best, best_score = None, 0.0
+        for topic, overlap in shared.items():
+            topic_grams, topic_tokens = self._topics[topic]
+            score = overlap / (len(grams) + len(topic_grams) - overlap)
+            if score <= best_score or _numbers(topic_tokens) != numbers:
+                continue
+            if _covered(tokens, topic_tokens, self.threshold) and _covered(topic_tokens, tokens, self.threshold):
+                best, best_score = topic, score
+        return best
+
+    def _add(self, key):
+        # Caller holds the lock
+        grams = trigrams(key)
+        self._topics[key] = (grams, set(key.split()))
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+        while len(self._topics) > self.max_topics:
+            evicted, (evicted_grams, _) = self._topics.popitem(last=False)
+            for gram in evicted_grams:
+                postings = self._postings.get(gram)
+                postings.discard(evicted)
+                if not postings:
+                    del self._postings[gram]
+
+    def __len__(self):
+        return len(self._topics)
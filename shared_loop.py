@@ -0,0 +1,122 @@
+"""
+One asyncio event loop per worker process for every async view and background task.
+
+Flask normally runs each `async def` view in a brand-new event loop on the
+request thread, so coroutines from different requests never overlap. The app
+instead hands coroutines to this module: under an ASGI server the server's own
+loop is bound at startup; under a plain WSGI server a loop is started on a
+daemon thread on first use. Request threads block on their own coroutine while
+the loop interleaves all in-flight pipelines.
+
+Blocking calls made from coroutines (requests, Firestore, SDKs) must go through
+`asyncio.to_thread`, which uses the loop's default executor sized by
+BLOCKING_IO_THREADS.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+BLOCKING_IO_THREADS = int(os.environ.get('BLOCKING_IO_THREADS', 64))
+
+_loop = None
+_loop_thread = None
+_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    global _loop, _loop_thread, _lock
+    # The loop thread does not survive fork; children start their own loop.
+    _loop = None
+    _loop_thread = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _configure(loop):
+    loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+        max_workers=BLOCKING_IO_THREADS, thread_name_prefix='blocking-io'
+    ))
+
+
+def bind(loop):
+    """Use an already running loop (the ASGI server's) as the shared loop"""
+    global _loop
+    with _lock:
+        if _loop is loop:
+            return
+        _configure(loop)
+        _loop = loop
+    logger.info("Async views bound to the server event loop")
+
+
+def get_loop():
+    """Return the shared loop, starting a background loop thread if none is bound"""
+    global _loop, _loop_thread
+    loop = _loop
+    if loop is not None:
+        return loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            _configure(loop)
+            _loop_thread = threading.Thread(
+                target=loop.run_forever, name='shared-event-loop', daemon=True
+            )
+            _loop_thread.start()
+            _loop = loop
+            logger.info("Started shared event loop thread")
+        return _loop
+
+
+def submit(coro):
+    """
+    Schedule a coroutine on the shared loop and return a concurrent.futures.Future.
+
+    The task runs in a copy of the caller's context, so Flask's request and
+    app contexts stay available inside async views.
+    """
+    loop = get_loop()
+    future = concurrent.futures.Future()
+    context = contextvars.copy_context()
+
+    def _start():
+        if not future.set_running_or_notify_cancel():
+            coro.close()
+            return
+        task = loop.create_task(coro)
+
+        def _done(task):
+            if task.cancelled():
+                future.set_exception(concurrent.futures.CancelledError())
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        task.add_done_callback(_done)
+
+    loop.call_soon_threadsafe(_start, context=context)
+    return future
+
+
+def in_loop_thread():
+    try:
+        return asyncio.get_running_loop() is _loop
+    except RuntimeError:
+        return False
+
+
+def run(coro):
+    """Run a coroutine on the shared loop and block the calling thread for its result"""
+    if in_loop_thread():
+        coro.close()
+        raise RuntimeError("shared_loop.run() called from the shared loop itself; await the coroutine instead")
+    return submit(coro).result()
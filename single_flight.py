@@ -0,0 +1,69 @@
+"""
+Single-flight coalescing of identical concurrent work.
+
+While a computation for a key is in flight, later callers with the same key
+await it instead of starting their own, and everyone gets its result (or its
+exception). The first caller receives the result object itself; callers that
+joined get deep copies of a snapshot taken as the computation finished, since
+the pipeline enriches article dicts in place. The shared computation runs as
+its own task, so a caller that is cancelled (client gone, deadline) does not
+cancel it for the others.
+
+Must be used from one event loop (the worker's shared loop).
+"""
+import asyncio
+import copy
+
+from metrics import record_single_flight
+
+
+class SingleFlight:
+    """In-flight computations by key; `name` labels the metrics"""
+
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+
+    def _flight(self, key, start):
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if joined:
+            flight['joined'] += 1
+        else:
+            flight = {'task': asyncio.ensure_future(start()), 'joined': 0}
+            self._flights[key] = flight
+            flight['task'].add_done_callback(lambda task: self._finish(key, flight, task))
+        record_single_flight(self.name, joined)
+        return flight, joined
+
+    async def do(self, key, start):
+        """Result of `start()` (a coroutine factory), shared with concurrent callers of `key`"""
+        flight, joined = self._flight(key, start)
+        result = await asyncio.shield(flight['task'])
+        if joined:
+            return copy.deepcopy(flight['snapshot'])
+        return result
+
+    def launch(self, key, start):
+        """
+        Start (or join) the computation for `key` right away and return a
+        future of its result; cancelling that future leaves the computation
+        running. The result is not copied, so use it for immutable results.
+        """
+        flight, _ = self._flight(key, start)
+        return asyncio.shield(flight['task'])
+
+    def _finish(self, key, flight, task):
+        # Runs before any awaiting caller resumes, so the snapshot is untouched
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # (nobody can join a finished flight, so `joined` is final here)
+        if not task.cancelled() and task.exception() is None and flight['joined']:
+            flight['snapshot'] = copy.deepcopy(task.result())
+
+    def __contains__(self, key):
+        """Whether a computation for `key` is in flight"""
+        return key in self._flights
+
+    def __len__(self):
+        return len(self._flights)
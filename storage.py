@@ -0,0 +1,980 @@
+"""
+Storage for categories and news items.
+
+The API and the news pipeline talk to a NewsRepository instead of the
+Firestore client directly. Two backends are provided:
+
+- FirestoreNewsRepository: production storage (users/{uid}/categories/{cid}/news_items)
+- SQLiteNewsRepository: a local file or in-memory database for offline runs and load tests
+
+WriteBehindRepository can wrap either backend to buffer news item writes and
+flush them in batches (one Firestore batch commit instead of one round trip
+per item).
+
+Each pipeline run also writes a feed snapshot: one document per category
+holding the ordered list of compact news cards, so a feed loads with a
+single document read. It is removed whenever the category's news items are
+cleared.
+
+Deleting a category is a two-step job: mark_category_deleted() hides the
+category and records a deletion job, and a background CategoryDeleter
+(deletion.py) removes the news items in chunks and finishes the job.
+"""
+import atexit
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+
+def new_document_id():
+    """Client-side document id, so callers know item ids before a buffered write lands"""
+    return uuid.uuid4().hex[:20]
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def deletion_job_id(user_id, category_id):
+    return f"{user_id}:{category_id}"
+
+
+def estimate_document_size(data):
+    """
+    Approximate stored size of a document in bytes, using Firestore's storage
+    size rules (string UTF-8 length + 1, 8 per number and timestamp, 1 per
+    boolean and null, field name length + 1, plus 32 bytes per document).
+    The document id under 'id' is not counted.
+    """
+    def size(value):
+        if value is None or isinstance(value, bool):
+            return 1
+        if isinstance(value, str):
+            return len(value.encode('utf-8')) + 1
+        if isinstance(value, (int, float, datetime.datetime)):
+            return 8
+        if isinstance(value, dict):
+            return sum(len(key.encode('utf-8')) + 1 + size(item) for key, item in value.items())
+        if isinstance(value, (list, tuple)):
+            return sum(size(item) for item in value)
+        return len(str(value).encode('utf-8')) + 1
+
+    return 32 + size({key: value for key, value in data.items() if key != 'id'})
+
+
+class NewsRepository(ABC):
+    """
+    Interface for category and news item storage.
+
+    Category and news item dicts carry their document id under 'id'.
+    Timestamps (createdAt, publishedAt, lastRefreshedAt) are set by the
+    repository on write and come back as timezone-aware datetimes. Categories
+    marked deleted are treated as missing by list_categories and get_category.
+
+    Categories carry a newsCount counter kept in step with add_news_items and
+    clear_news_items; categories written before the counter existed lack it
+    and are counted with count_news_items.
+    """
+
+    @abstractmethod
+    def list_user_ids(self):
+        """Every user id that has categories (used by maintenance commands)"""
+
+    @abstractmethod
+    def list_categories(self, user_id):
+        """Every category of a user that is not being deleted"""
+
+    @abstractmethod
+    def get_category(self, user_id, category_id):
+        """Return the category dict or None if it does not exist (or is being deleted)"""
+
+    @abstractmethod
+    def create_category(self, user_id, data):
+        """Store a new category and return its id"""
+
+    def delete_category(self, user_id, category_id):
+        """Delete a category and its news items; return the number of items deleted"""
+        deleted = self.clear_news_items(user_id, category_id)
+        self._delete_category_document(user_id, category_id)
+        return deleted
+
+    @abstractmethod
+    def _delete_category_document(self, user_id, category_id):
+        """Delete only the category document"""
+
+    @abstractmethod
+    def mark_category_deleted(self, user_id, category_id):
+        """
+        Hide a category (dropping its feed snapshot) and record a deletion job
+        for it in one write. Return the job dict, or None if the category does
+        not exist.
+        """
+
+    @abstractmethod
+    def list_category_deletions(self):
+        """Every unfinished deletion job (id, userId, categoryId, deletedNewsItems, updatedAt)"""
+
+    @abstractmethod
+    def get_category_deletion(self, job_id):
+        """Return a deletion job or None if it has finished"""
+
+    @abstractmethod
+    def update_category_deletion(self, job_id, deleted_items):
+        """Record a deletion job's progress (also refreshes updatedAt)"""
+
+    @abstractmethod
+    def finish_category_deletion(self, job):
+        """Delete the category document and its deletion job"""
+
+    @abstractmethod
+    def list_news_item_ids(self, user_id, category_id, limit):
+        """Up to `limit` news item ids of a category, without reading the documents"""
+
+    @abstractmethod
+    def delete_news_items(self, user_id, category_id, item_ids):
+        """Delete the given news items in one write; return how many were requested"""
+
+    @abstractmethod
+    def record_category_refresh(self, user_id, category_id, thumbnail_url):
+        """Stamp lastRefreshedAt and store the category's thumbnail after a pipeline run"""
+
+    @abstractmethod
+    def update_category_thumbnail(self, user_id, category_id, thumbnail_url):
+        """Replace the category's thumbnail (e.g. once pending articles have their images)"""
+
+    @abstractmethod
+    def count_news_items(self, user_id, category_id):
+        """Count a category's news items (aggregation query, no document reads)"""
+
+    @abstractmethod
+    def backfill_news_count(self, user_id, category_id, count):
+        """Store `count` as the category's newsCount unless it already has one"""
+
+    @abstractmethod
+    def list_news_items(self, user_id, category_id):
+        """Return news items newest first"""
+
+    @abstractmethod
+    def get_news_item(self, user_id, category_id, item_id):
+        """Return one news item or None if it does not exist"""
+
+    @abstractmethod
+    def write_feed_snapshot(self, user_id, category_id, cards):
+        """
+        Replace the category's feed snapshot with `cards` (stamped updatedAt);
+        skipped when the category no longer exists or is being deleted
+        """
+
+    @abstractmethod
+    def get_feed_snapshot(self, user_id, category_id):
+        """Return {'items': cards, 'updatedAt': datetime} or None if there is none"""
+
+    def add_news_item(self, user_id, category_id, data, item_id=None):
+        """Store a news item and return its id"""
+        return self.add_news_items(user_id, category_id, [data], [item_id])[0]
+
+    @abstractmethod
+    def add_news_items(self, user_id, category_id, items, item_ids=None):
+        """Store several news items in one write where the backend allows it"""
+
+    @abstractmethod
+    def update_news_item(self, user_id, category_id, item_id, fields):
+        """Merge `fields` into a stored news item; return False if it no longer exists"""
+
+    @abstractmethod
+    def rewrite_news_items(self, user_id, category_id, items):
+        """
+        Replace stored news items with `items` (dicts with 'id'), keeping their
+        publishedAt; used by schema migrations
+        """
+
+    @abstractmethod
+    def clear_news_items(self, user_id, category_id):
+        """Delete every news item in a category; return how many were deleted"""
+
+    def flush(self, user_id=None, category_id=None):
+        """Persist buffered writes (no-op for unbuffered backends)"""
+
+
+class FirestoreNewsRepository(NewsRepository):
+    """Firestore layout: users/{user_id}/categories/{category_id}/news_items/{item_id}"""
+
+    # Firestore rejects batches with more than 500 writes
+    MAX_BATCH_WRITES = 500
+
+    def __init__(self, db):
+        from firebase_admin import firestore
+        self._db = db
+        self._firestore = firestore
+
+    def _categories(self, user_id):
+        return self._db.collection('users').document(user_id).collection('categories')
+
+    def _news_items(self, user_id, category_id):
+        return self._categories(user_id).document(category_id).collection('news_items')
+
+    def _deletions(self):
+        return self._db.collection('category_deletions')
+
+    def _feed_snapshot(self, user_id, category_id):
+        return self._categories(user_id).document(category_id).collection('feed').document('snapshot')
+
+    def list_user_ids(self):
+        # User documents only exist as parents of categories; list_documents
+        # includes such missing parents
+        return [doc.id for doc in self._db.collection('users').list_documents()]
+
+    def list_categories(self, user_id):
+        categories = []
+        for doc in self._categories(user_id).stream():
+            data = doc.to_dict()
+            if not data.get('deleted'):
+                categories.append({"id": doc.id, **data})
+        return categories
+
+    def get_category(self, user_id, category_id):
+        doc = self._categories(user_id).document(category_id).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        if data.get('deleted'):
+            return None
+        return {"id": doc.id, **data}
+
+    def create_category(self, user_id, data):
+        doc_ref = self._categories(user_id).add({
+            **data,
+            "createdAt": self._firestore.SERVER_TIMESTAMP,
+        })
+        return doc_ref[1].id
+
+    def _delete_category_document(self, user_id, category_id):
+        self._categories(user_id).document(category_id).delete()
+
+    def mark_category_deleted(self, user_id, category_id):
+        category_ref = self._categories(user_id).document(category_id)
+        doc = category_ref.get()
+        if not doc.exists:
+            return None
+        job_id = deletion_job_id(user_id, category_id)
+        if doc.to_dict().get('deleted'):
+            return self.get_category_deletion(job_id)
+
+        job = {"userId": user_id, "categoryId": category_id, "deletedNewsItems": 0}
+        batch = self._db.batch()
+        batch.update(category_ref, {"deleted": True, "deletedAt": self._firestore.SERVER_TIMESTAMP})
+        batch.delete(self._feed_snapshot(user_id, category_id))
+        batch.set(self._deletions().document(job_id), {
+            **job,
+            "createdAt": self._firestore.SERVER_TIMESTAMP,
+            "updatedAt": self._firestore.SERVER_TIMESTAMP,
+        })
+        batch.commit()
+        return {"id": job_id, **job, "updatedAt": _utcnow()}
+
+    def list_category_deletions(self):
+        return [{"id": doc.id, **doc.to_dict()} for doc in self._deletions().stream()]
+
+    def get_category_deletion(self, job_id):
+        doc = self._deletions().document(job_id).get()
+        if not doc.exists:
+            return None
+        return {"id": doc.id, **doc.to_dict()}
+
+    def update_category_deletion(self, job_id, deleted_items):
+        self._deletions().document(job_id).update({
+            "deletedNewsItems": deleted_items,
+            "updatedAt": self._firestore.SERVER_TIMESTAMP,
+        })
+
+    def finish_category_deletion(self, job):
+        batch = self._db.batch()
+        batch.delete(self._feed_snapshot(job['userId'], job['categoryId']))
+        batch.delete(self._categories(job['userId']).document(job['categoryId']))
+        batch.delete(self._deletions().document(job['id']))
+        batch.commit()
+
+    def list_news_item_ids(self, user_id, category_id, limit):
+        # Projecting only __name__ returns document ids without their fields
+        query = self._news_items(user_id, category_id).select(['__name__']).limit(limit)
+        return [doc.id for doc in query.stream()]
+
+    def delete_news_items(self, user_id, category_id, item_ids):
+        news_items_ref = self._news_items(user_id, category_id)
+        for start in range(0, len(item_ids), self.MAX_BATCH_WRITES):
+            batch = self._db.batch()
+            for item_id in item_ids[start:start + self.MAX_BATCH_WRITES]:
+                batch.delete(news_items_ref.document(item_id))
+            batch.commit()
+        return len(item_ids)
+
+    def record_category_refresh(self, user_id, category_id, thumbnail_url):
+        from google.api_core.exceptions import NotFound
+        try:
+            self._categories(user_id).document(category_id).update({
+                "lastRefreshedAt": self._firestore.SERVER_TIMESTAMP,
+                "thumbnailUrl": thumbnail_url,
+            })
+        except NotFound:
+            pass
+
+    def update_category_thumbnail(self, user_id, category_id, thumbnail_url):
+        from google.api_core.exceptions import NotFound
+        try:
+            self._categories(user_id).document(category_id).update({"thumbnailUrl": thumbnail_url})
+        except NotFound:
+            pass
+
+    def count_news_items(self, user_id, category_id):
+        result = self._news_items(user_id, category_id).count().get()
+        return int(result[0][0].value)
+
+    def backfill_news_count(self, user_id, category_id, count):
+        category_ref = self._categories(user_id).document(category_id)
+
+        # Transactional so a counter set meanwhile (by a write or clear) wins
+        @self._firestore.transactional
+        def backfill(transaction):
+            snapshot = category_ref.get(transaction=transaction)
+            if snapshot.exists and 'newsCount' not in snapshot.to_dict():
+                transaction.update(category_ref, {"newsCount": count})
+
+        backfill(self._db.transaction())
+
+    def list_news_items(self, user_id, category_id):
+        query = self._news_items(user_id, category_id).order_by(
+            'publishedAt', direction=self._firestore.Query.DESCENDING
+        )
+        return [{"id": doc.id, **doc.to_dict()} for doc in query.stream()]
+
+    def get_news_item(self, user_id, category_id, item_id):
+        doc = self._news_items(user_id, category_id).document(item_id).get()
+        if not doc.exists:
+            return None
+        return {"id": doc.id, **doc.to_dict()}
+
+    def write_feed_snapshot(self, user_id, category_id, cards):
+        category_ref = self._categories(user_id).document(category_id)
+        snapshot_ref = self._feed_snapshot(user_id, category_id)
+
+        # Transactional so a pipeline finishing during a delete cannot bring
+        # the feed of a deleted category back
+        @self._firestore.transactional
+        def write(transaction):
+            category = category_ref.get(transaction=transaction)
+            if not category.exists or category.to_dict().get('deleted'):
+                return
+            transaction.set(snapshot_ref, {
+                "items": cards,
+                "updatedAt": self._firestore.SERVER_TIMESTAMP,
+            })
+
+        write(self._db.transaction())
+
+    def get_feed_snapshot(self, user_id, category_id):
+        doc = self._feed_snapshot(user_id, category_id).get()
+        if not doc.exists:
+            return None
+        return doc.to_dict()
+
+    def add_news_items(self, user_id, category_id, items, item_ids=None):
+        news_items_ref = self._news_items(user_id, category_id)
+        category_ref = self._categories(user_id).document(category_id)
+        item_ids = [item_id or new_document_id() for item_id in (item_ids or [None] * len(items))]
+
+        # Leave room in each batch for the category counter update
+        chunk_size = self.MAX_BATCH_WRITES - 1
+        for start in range(0, len(items), chunk_size):
+            batch = self._db.batch()
+            chunk = list(zip(items[start:start + chunk_size], item_ids[start:start + chunk_size]))
+            for data, item_id in chunk:
+                batch.set(news_items_ref.document(item_id), {
+                    **data,
+                    "publishedAt": self._firestore.SERVER_TIMESTAMP,
+                })
+            batch.update(category_ref, {"newsCount": self._firestore.Increment(len(chunk))})
+            batch.commit()
+        return item_ids
+
+    def update_news_item(self, user_id, category_id, item_id, fields):
+        from google.api_core.exceptions import NotFound
+        try:
+            self._news_items(user_id, category_id).document(item_id).update(fields)
+        except NotFound:
+            return False
+        return True
+
+    def rewrite_news_items(self, user_id, category_id, items):
+        news_items_ref = self._news_items(user_id, category_id)
+        for start in range(0, len(items), self.MAX_BATCH_WRITES):
+            batch = self._db.batch()
+            for item in items[start:start + self.MAX_BATCH_WRITES]:
+                data = {key: value for key, value in item.items() if key != 'id'}
+                batch.set(news_items_ref.document(item['id']), data)
+            batch.commit()
+
+    def clear_news_items(self, user_id, category_id):
+        deleted = 0
+        batch = self._db.batch()
+        pending = 0
+        for doc in self._news_items(user_id, category_id).stream():
+            batch.delete(doc.reference)
+            pending += 1
+            deleted += 1
+            if pending == self.MAX_BATCH_WRITES:
+                batch.commit()
+                batch = self._db.batch()
+                pending = 0
+        if pending:
+            batch.commit()
+        self._feed_snapshot(user_id, category_id).delete()
+
+        from google.api_core.exceptions import NotFound
+        try:
+            self._categories(user_id).document(category_id).update({"newsCount": 0})
+        except NotFound:
+            pass
+        return deleted
+
+
+class SQLiteNewsRepository(NewsRepository):
+    """
+    Local backend storing each document as JSON in SQLite.
+
+    path=':memory:' gives a throwaway in-process database, handy for load tests
+    and running the service without Firebase credentials.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS categories (
+        user_id TEXT NOT NULL,
+        id TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (user_id, id)
+    );
+    CREATE TABLE IF NOT EXISTS news_items (
+        user_id TEXT NOT NULL,
+        category_id TEXT NOT NULL,
+        id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        published_at TEXT NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (user_id, category_id, id)
+    );
+    CREATE INDEX IF NOT EXISTS news_items_by_category
+        ON news_items (user_id, category_id, published_at, seq);
+    CREATE TABLE IF NOT EXISTS feed_snapshots (
+        user_id TEXT NOT NULL,
+        category_id TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (user_id, category_id)
+    );
+    CREATE TABLE IF NOT EXISTS category_deletions (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        category_id TEXT NOT NULL,
+        deleted_items INTEGER NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, path=':memory:'):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(self.SCHEMA)
+        self._seq = 0
+
+    @staticmethod
+    def _dumps(data):
+        return json.dumps(data, default=str)
+
+    @staticmethod
+    def _loads(doc_id, raw, **timestamps):
+        data = json.loads(raw)
+        for field, value in timestamps.items():
+            data[field] = datetime.datetime.fromisoformat(value)
+        if isinstance(data.get('lastRefreshedAt'), str):
+            data['lastRefreshedAt'] = datetime.datetime.fromisoformat(data['lastRefreshedAt'])
+        return {"id": doc_id, **data}
+
+    def _update_category_data(self, user_id, category_id, update):
+        # Caller holds the lock and the transaction
+        row = self._conn.execute(
+            "SELECT data FROM categories WHERE user_id = ? AND id = ?", (user_id, category_id)
+        ).fetchone()
+        if row is not None:
+            self._conn.execute(
+                "UPDATE categories SET data = ? WHERE user_id = ? AND id = ?",
+                (self._dumps(update(json.loads(row[0]))), user_id, category_id),
+            )
+
+    def list_user_ids(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT user_id FROM categories ORDER BY user_id").fetchall()
+        return [row[0] for row in rows]
+
+    def list_categories(self, user_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, data, created_at FROM categories WHERE user_id = ? ORDER BY created_at",
+                (user_id,),
+            ).fetchall()
+        categories = [self._loads(doc_id, raw, createdAt=created) for doc_id, raw, created in rows]
+        return [category for category in categories if not category.get('deleted')]
+
+    def get_category(self, user_id, category_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, data, created_at FROM categories WHERE user_id = ? AND id = ?",
+                (user_id, category_id),
+            ).fetchone()
+        if row is None:
+            return None
+        category = self._loads(row[0], row[1], createdAt=row[2])
+        return None if category.get('deleted') else category
+
+    def create_category(self, user_id, data):
+        category_id = new_document_id()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO categories (user_id, id, created_at, data) VALUES (?, ?, ?, ?)",
+                (user_id, category_id, _utcnow().isoformat(), self._dumps(data)),
+            )
+        return category_id
+
+    def _delete_category_document(self, user_id, category_id):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM categories WHERE user_id = ? AND id = ?", (user_id, category_id)
+            )
+
+    @staticmethod
+    def _job(row):
+        job_id, user_id, category_id, deleted_items, updated_at = row
+        return {
+            "id": job_id,
+            "userId": user_id,
+            "categoryId": category_id,
+            "deletedNewsItems": deleted_items,
+            "updatedAt": datetime.datetime.fromisoformat(updated_at),
+        }
+
+    _JOB_COLUMNS = "id, user_id, category_id, deleted_items, updated_at"
+
+    def mark_category_deleted(self, user_id, category_id):
+        job_id = deletion_job_id(user_id, category_id)
+        now = _utcnow().isoformat()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT data FROM categories WHERE user_id = ? AND id = ?", (user_id, category_id)
+            ).fetchone()
+            if row is None:
+                return None
+            data = json.loads(row[0])
+            if not data.get('deleted'):
+                self._conn.execute(
+                    "UPDATE categories SET data = ? WHERE user_id = ? AND id = ?",
+                    (self._dumps({**data, "deleted": True, "deletedAt": now}), user_id, category_id),
+                )
+                self._conn.execute(
+                    "DELETE FROM feed_snapshots WHERE user_id = ? AND category_id = ?", (user_id, category_id)
+                )
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO category_deletions (id, user_id, category_id, deleted_items, updated_at) "
+                    "VALUES (?, ?, ?, 0, ?)",
+                    (job_id, user_id, category_id, now),
+                )
+        return self.get_category_deletion(job_id)
+
+    def list_category_deletions(self):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {self._JOB_COLUMNS} FROM category_deletions").fetchall()
+        return [self._job(row) for row in rows]
+
+    def get_category_deletion(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self._JOB_COLUMNS} FROM category_deletions WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._job(row) if row else None
+
+    def update_category_deletion(self, job_id, deleted_items):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE category_deletions SET deleted_items = ?, updated_at = ? WHERE id = ?",
+                (deleted_items, _utcnow().isoformat(), job_id),
+            )
+
+    def finish_category_deletion(self, job):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM feed_snapshots WHERE user_id = ? AND category_id = ?", (job['userId'], job['categoryId'])
+            )
+            self._conn.execute(
+                "DELETE FROM categories WHERE user_id = ? AND id = ?", (job['userId'], job['categoryId'])
+            )
+            self._conn.execute("DELETE FROM category_deletions WHERE id = ?", (job['id'],))
+
+    def list_news_item_ids(self, user_id, category_id, limit):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM news_items WHERE user_id = ? AND category_id = ? LIMIT ?",
+                (user_id, category_id, limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def delete_news_items(self, user_id, category_id, item_ids):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM news_items WHERE user_id = ? AND category_id = ? AND id = ?",
+                [(user_id, category_id, item_id) for item_id in item_ids],
+            )
+        return len(item_ids)
+
+    def record_category_refresh(self, user_id, category_id, thumbnail_url):
+        refreshed_at = _utcnow().isoformat()
+        with self._lock, self._conn:
+            self._update_category_data(user_id, category_id, lambda data: {
+                **data, "lastRefreshedAt": refreshed_at, "thumbnailUrl": thumbnail_url,
+            })
+
+    def update_category_thumbnail(self, user_id, category_id, thumbnail_url):
+        with self._lock, self._conn:
+            self._update_category_data(user_id, category_id, lambda data: {**data, "thumbnailUrl": thumbnail_url})
+
+    def backfill_news_count(self, user_id, category_id, count):
+        with self._lock, self._conn:
+            self._update_category_data(
+                user_id, category_id, lambda data: data if 'newsCount' in data else {**data, "newsCount": count}
+            )
+
+    def count_news_items(self, user_id, category_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM news_items WHERE user_id = ? AND category_id = ?",
+                (user_id, category_id),
+            ).fetchone()
+        return row[0]
+
+    def list_news_items(self, user_id, category_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, data, published_at FROM news_items WHERE user_id = ? AND category_id = ? "
+                "ORDER BY published_at DESC, seq DESC",
+                (user_id, category_id),
+            ).fetchall()
+        return [self._loads(doc_id, raw, publishedAt=published) for doc_id, raw, published in rows]
+
+    def get_news_item(self, user_id, category_id, item_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, data, published_at FROM news_items WHERE user_id = ? AND category_id = ? AND id = ?",
+                (user_id, category_id, item_id),
+            ).fetchone()
+        if row is None:
+            return None
+        return self._loads(row[0], row[1], publishedAt=row[2])
+
+    def write_feed_snapshot(self, user_id, category_id, cards):
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT data FROM categories WHERE user_id = ? AND id = ?", (user_id, category_id)
+            ).fetchone()
+            if row is None or json.loads(row[0]).get('deleted'):
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO feed_snapshots (user_id, category_id, updated_at, data) VALUES (?, ?, ?, ?)",
+                (user_id, category_id, _utcnow().isoformat(), self._dumps({"items": cards})),
+            )
+
+    def get_feed_snapshot(self, user_id, category_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, updated_at FROM feed_snapshots WHERE user_id = ? AND category_id = ?",
+                (user_id, category_id),
+            ).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(row[0]), "updatedAt": datetime.datetime.fromisoformat(row[1])}
+
+    def add_news_items(self, user_id, category_id, items, item_ids=None):
+        item_ids = [item_id or new_document_id() for item_id in (item_ids or [None] * len(items))]
+        published_at = _utcnow().isoformat()
+        with self._lock, self._conn:
+            rows = []
+            for data, item_id in zip(items, item_ids):
+                self._seq += 1
+                rows.append((user_id, category_id, item_id, self._seq, published_at, self._dumps(data)))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO news_items (user_id, category_id, id, seq, published_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._update_category_data(user_id, category_id, lambda data: {
+                **data, "newsCount": data.get('newsCount', 0) + len(rows),
+            })
+        return item_ids
+
+    def update_news_item(self, user_id, category_id, item_id, fields):
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT data FROM news_items WHERE user_id = ? AND category_id = ? AND id = ?",
+                (user_id, category_id, item_id),
+            ).fetchone()
+            if row is None:
+                return False
+            self._conn.execute(
+                "UPDATE news_items SET data = ? WHERE user_id = ? AND category_id = ? AND id = ?",
+                (self._dumps({**json.loads(row[0]), **fields}), user_id, category_id, item_id),
+            )
+        return True
+
+    def rewrite_news_items(self, user_id, category_id, items):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE news_items SET data = ? WHERE user_id = ? AND category_id = ? AND id = ?",
+                [
+                    (
+                        self._dumps({k: v for k, v in item.items() if k not in ('id', 'publishedAt')}),
+                        user_id, category_id, item['id'],
+                    )
+                    for item in items
+                ],
+            )
+
+    def clear_news_items(self, user_id, category_id):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM news_items WHERE user_id = ? AND category_id = ?", (user_id, category_id)
+            )
+            self._conn.execute(
+                "DELETE FROM feed_snapshots WHERE user_id = ? AND category_id = ?", (user_id, category_id)
+            )
+            self._update_category_data(user_id, category_id, lambda data: {**data, "newsCount": 0})
+        return cursor.rowcount
+
+
+class WriteBehindRepository(NewsRepository):
+    """
+    Buffer news item writes and flush them to the wrapped repository in batches.
+
+    A category's buffer is flushed when it reaches max_batch items, after
+    flush_interval seconds, on explicit flush(), and before any read, clear or
+    delete touching that category, so callers always read their own writes
+    (a flush also waits for a write of the same category already in flight).
+    A feed snapshot written while items are buffered is held back and written
+    right after them, so it never lists items the backend does not have yet.
+    """
+
+    def __init__(self, inner, max_batch=20, flush_interval=0.5):
+        self._inner = inner
+        self._max_batch = max_batch
+        self._flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._written = threading.Condition(self._lock)  # notified when a key leaves _writing
+        self._pending = {}  # (user_id, category_id) -> [(item_id, data), ...]
+        self._snapshots = {}  # (user_id, category_id) -> cards waiting for the items above
+        self._writing = set()  # keys whose taken entries or snapshot are being written
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name='write-behind-flusher', daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _flush_periodically(self):
+        while not self._stopped.wait(self._flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stopped.set()
+        self.flush()
+
+    def _take(self, key):
+        with self._written:
+            # One write per category at a time: wait for the one in flight, so
+            # everything buffered before this call has landed once it returns
+            self._written.wait_for(lambda: key not in self._writing)
+            entries = self._pending.pop(key, [])
+            cards = self._snapshots.pop(key, None)
+            if entries or cards is not None:
+                self._writing.add(key)
+            return entries, cards
+
+    def _write(self, key, entries, cards):
+        if not entries and cards is None:
+            return
+        try:
+            if entries:
+                item_ids = [item_id for item_id, _ in entries]
+                items = [data for _, data in entries]
+                self._inner.add_news_items(key[0], key[1], items, item_ids)
+                entries = None
+            if cards is not None:
+                self._inner.write_feed_snapshot(key[0], key[1], cards)
+                cards = None
+        finally:
+            with self._written:
+                # Put back whatever was not written so the next flush retries it
+                if entries:
+                    self._pending[key] = entries + self._pending.get(key, [])
+                if cards is not None:
+                    self._snapshots.setdefault(key, cards)
+                self._writing.discard(key)
+                self._written.notify_all()
+
+    def flush(self, user_id=None, category_id=None):
+        if user_id is not None and category_id is not None:
+            key = (user_id, category_id)
+            self._write(key, *self._take(key))
+            return
+        with self._lock:
+            keys = list(self._pending.keys() | self._snapshots.keys())
+        # One failing category must not hold back the others
+        for key in keys:
+            try:
+                self._write(key, *self._take(key))
+            except Exception as e:
+                logger.error(f"Write-behind flush of {key[1]} failed: {e}")
+
+    def list_user_ids(self):
+        return self._inner.list_user_ids()
+
+    def list_categories(self, user_id):
+        return self._inner.list_categories(user_id)
+
+    def get_category(self, user_id, category_id):
+        return self._inner.get_category(user_id, category_id)
+
+    def create_category(self, user_id, data):
+        return self._inner.create_category(user_id, data)
+
+    def _discard(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+            self._snapshots.pop(key, None)
+
+    def _delete_category_document(self, user_id, category_id):
+        self._discard((user_id, category_id))
+        self._inner._delete_category_document(user_id, category_id)
+
+    def mark_category_deleted(self, user_id, category_id):
+        return self._inner.mark_category_deleted(user_id, category_id)
+
+    def list_category_deletions(self):
+        return self._inner.list_category_deletions()
+
+    def get_category_deletion(self, job_id):
+        return self._inner.get_category_deletion(job_id)
+
+    def update_category_deletion(self, job_id, deleted_items):
+        self._inner.update_category_deletion(job_id, deleted_items)
+
+    def finish_category_deletion(self, job):
+        self._discard((job['userId'], job['categoryId']))
+        self._inner.finish_category_deletion(job)
+
+    def record_category_refresh(self, user_id, category_id, thumbnail_url):
+        self._inner.record_category_refresh(user_id, category_id, thumbnail_url)
+
+    def update_category_thumbnail(self, user_id, category_id, thumbnail_url):
+        self._inner.update_category_thumbnail(user_id, category_id, thumbnail_url)
+
+    def count_news_items(self, user_id, category_id):
+        self.flush(user_id, category_id)
+        return self._inner.count_news_items(user_id, category_id)
+
+    def backfill_news_count(self, user_id, category_id, count):
+        self._inner.backfill_news_count(user_id, category_id, count)
+
+    def list_news_item_ids(self, user_id, category_id, limit):
+        self.flush(user_id, category_id)
+        return self._inner.list_news_item_ids(user_id, category_id, limit)
+
+    def delete_news_items(self, user_id, category_id, item_ids):
+        # Drop buffered writes of these items so a later flush cannot bring them back
+        key = (user_id, category_id)
+        deleted = set(item_ids)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending:
+                self._pending[key] = [(item_id, data) for item_id, data in pending if item_id not in deleted]
+        return self._inner.delete_news_items(user_id, category_id, item_ids)
+
+    def list_news_items(self, user_id, category_id):
+        self.flush(user_id, category_id)
+        return self._inner.list_news_items(user_id, category_id)
+
+    def get_news_item(self, user_id, category_id, item_id):
+        self.flush(user_id, category_id)
+        return self._inner.get_news_item(user_id, category_id, item_id)
+
+    def write_feed_snapshot(self, user_id, category_id, cards):
+        key = (user_id, category_id)
+        with self._lock:
+            if self._pending.get(key) or key in self._writing:
+                self._snapshots[key] = cards
+                return
+            self._snapshots.pop(key, None)
+        self._inner.write_feed_snapshot(user_id, category_id, cards)
+
+    def get_feed_snapshot(self, user_id, category_id):
+        self.flush(user_id, category_id)
+        return self._inner.get_feed_snapshot(user_id, category_id)
+
+    def add_news_items(self, user_id, category_id, items, item_ids=None):
+        key = (user_id, category_id)
+        item_ids = [item_id or new_document_id() for item_id in (item_ids or [None] * len(items))]
+        with self._lock:
+            pending = self._pending.setdefault(key, [])
+            pending.extend(zip(item_ids, items))
+            full = len(pending) >= self._max_batch
+        if full:
+            self.flush(user_id, category_id)
+        return item_ids
+
+    def update_news_item(self, user_id, category_id, item_id, fields):
+        self.flush(user_id, category_id)
+        return self._inner.update_news_item(user_id, category_id, item_id, fields)
+
+    def rewrite_news_items(self, user_id, category_id, items):
+        self.flush(user_id, category_id)
+        self._inner.rewrite_news_items(user_id, category_id, items)
+
+    def clear_news_items(self, user_id, category_id):
+        # Buffered items belong to the category being cleared; write them so the
+        # backend sees one consistent state before the delete.
+        self.flush(user_id, category_id)
+        return self._inner.clear_news_items(user_id, category_id)
+
+
+def create_repository(backend, db=None):
+    """
+    Build the repository for STORAGE_BACKEND ('firestore', 'sqlite' or 'memory'),
+    wrapped in a write-behind buffer when WRITE_BEHIND is enabled.
+    """
+    backend = (backend or 'firestore').lower()
+    if backend == 'firestore':
+        repository = FirestoreNewsRepository(db)
+    elif backend == 'sqlite':
+        repository = SQLiteNewsRepository(os.environ.get('SQLITE_PATH', 'newsgenius.db'))
+    elif backend == 'memory':
+        repository = SQLiteNewsRepository(':memory:')
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+    if os.environ.get('WRITE_BEHIND', 'False').lower() == 'true':
+        repository = WriteBehindRepository(
+            repository,
+            max_batch=int(os.environ.get('WRITE_BEHIND_MAX_BATCH', 20)),
+            flush_interval=float(os.environ.get('WRITE_BEHIND_FLUSH_SECONDS', 0.5)),
+        )
+    logger.info(f"Storage backend: {backend}{' (write-behind)' if isinstance(repository, WriteBehindRepository) else ''}")
+    return repository
@@ -0,0 +1,122 @@
+"""
+Local extractive summaries and description quality checks.
+
+Used by the enhancement policy: descriptions that are already long and clean
+are kept as they are, and when Gemini is overloaded or its circuit is open the
+summary is extracted from the article's own title, description and content
+instead. Sentences are scored by how many title words and frequent article
+words they contain, with a bonus for leading sentences, and the best ones are
+kept in their original order.
+"""
+import re
+from collections import Counter
+
+# NewsAPI cuts content with "… [+1234 chars]"; NewsData's free tier sends a placeholder
+_TRUNCATION_MARKER = re.compile(r'\s*(…|\.\.\.)?\s*\[\+\d+ chars\]\s*$')
+_PLACEHOLDERS = ('ONLY AVAILABLE IN PAID PLANS',)
+_HTML = re.compile(r'<[^>]+>|&[a-z]+;|&#\d+;')
+_SENTENCE_END = re.compile(r'(?<=[.!?])["”\')\]]?\s+(?=[A-Z0-9"“\'(\[])')
+_WORD = re.compile(r"[A-Za-z0-9][A-Za-z0-9'\-]*")
+_TRAILING_ELLIPSIS = re.compile(r'\s*(…|\.\.\.)$')
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'been', 'but', 'by', 'for', 'from', 'has', 'have', 'he',
+    'her', 'his', 'in', 'is', 'it', 'its', 'of', 'on', 'or', 'said', 'says', 'she', 'that', 'the', 'their',
+    'they', 'this', 'to', 'was', 'were', 'will', 'with', 'which', 'who', 'would', 'after', 'about', 'more',
+}
+
+
+def clean_text(text):
+    """Article text without HTML remnants, truncation markers or paid-plan placeholders"""
+    text = text or ''
+    if any(placeholder in text for placeholder in _PLACEHOLDERS):
+        return ''
+    text = _HTML.sub(' ', text)
+    text = _TRUNCATION_MARKER.sub('', text)
+    return ' '.join(text.split())
+
+
+def is_truncated(text):
+    text = (text or '').rstrip()
+    return bool(_TRUNCATION_MARKER.search(text)) or text.endswith(('…', '...'))
+
+
+def description_is_good(description, min_words=60):
+    """
+    Whether a source description can be shown without rewriting: at least
+    `min_words` words, complete (not cut off by the source) and free of markup
+    """
+    if not description or is_truncated(description) or _HTML.search(description):
+        return False
+    if any(placeholder in description for placeholder in _PLACEHOLDERS):
+        return False
+    return len(description.split()) >= min_words
+
+
+def split_sentences(text):
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+def _comparable(sentence):
+    """Sentence text for duplicate checks: lowercase, without a cut-off ellipsis"""
+    return _TRAILING_ELLIPSIS.sub('', sentence).lower()
+
+
+def _words(text):
+    return [word.lower() for word in _WORD.findall(text) if word.lower() not in STOPWORDS]
+
+
+def extractive_summary(title, description, content=None, max_words=120):
+    """
+    Summary of up to `max_words` words made of the best-scoring sentences of
+    the description and content (description first); the cleaned description
+    (or title) when there is nothing to choose from.
+    """
+    sentences = []
+    for text in (clean_text(description), clean_text(content)):
+        for sentence in split_sentences(text):
+            if len(sentence.split()) < 4:
+                continue
+            # Content usually repeats the description, whose last sentence is
+            # often cut off ("Markets fell sharply after the…"): a sentence
+            # that starts another is the same sentence, and the full one is kept
+            key = _comparable(sentence)
+            for i, kept in enumerate(sentences):
+                kept_key = _comparable(kept)
+                if kept_key.startswith(key):
+                    break
+                if key.startswith(kept_key):
+                    sentences[i] = sentence
+                    break
+            else:
+                sentences.append(sentence)
+    if not sentences:
+        return clean_text(description) or clean_text(title)
+
+    title_words = set(_words(title or ''))
+    frequencies = Counter(word for sentence in sentences for word in _words(sentence))
+    top_frequency = max(frequencies.values(), default=1)
+
+    def score(position, sentence):
+        words = _words(sentence)
+        if not words:
+            return 0.0
+        title_overlap = sum(1 for word in words if word in title_words) / len(words)
+        frequency = sum(frequencies[word] for word in words) / (len(words) * top_frequency)
+        return 2 * title_overlap + frequency + 1 / (1 + position)
+
+    ranked = sorted(range(len(sentences)), key=lambda i: score(i, sentences[i]), reverse=True)
+    chosen, words = [], 0
+    for i in ranked:
+        length = len(sentences[i].split())
+        if chosen and words + length > max_words:
+            continue
+        chosen.append(i)
+        words += length
+        if words >= max_words:
+            break
+
+    summary = ' '.join(sentences[i] for i in sorted(chosen))
+    if len(summary.split()) > max_words:
+        summary = ' '.join(summary.split()[:max_words]).rstrip(',;:') + '…'
+    return summary
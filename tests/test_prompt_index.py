@@ -0,0 +1,42 @@
+import pytest
+
+from prompt_index import PromptIndex
+
+SAME_TOPIC = [
+    ("AI", "A.I. news"),
+    ("AI", "artificial intelligence"),
+    ("Artificial-Intelligence", "ai"),
+    ("artifical intelligence", "artificial intelligence"),
+    ("indian politics", "India politics"),
+    ("electric vehicles", "EV news"),
+    ("stock markets", "latest stock market news"),
+]
+
+# Broader or narrower topics, differing numbers and unrelated near spellings
+DIFFERENT_TOPICS = [
+    ("artificial intelligence", "AI regulation"),
+    ("artificial intelligence", "AI in healthcare"),
+    ("market stock", "Indian stock market"),
+    ("change climate", "climate change policy"),
+    ("world cup 2022", "world cup 2026"),
+    ("rust programming", "trust programming"),
+]
+
+
+@pytest.mark.parametrize("first, second", SAME_TOPIC)
+def test_same_topic_shares_a_key(first, second):
+    index = PromptIndex()
+    assert index.canonicalize(first) == index.canonicalize(second)
+
+
+@pytest.mark.parametrize("first, second", DIFFERENT_TOPICS)
+@pytest.mark.parametrize("reverse", [False, True])
+def test_different_topics_keep_their_own_keys(first, second, reverse):
+    if reverse:
+        first, second = second, first
+    index = PromptIndex()
+    assert index.canonicalize(first) != index.canonicalize(second)
+
+
+def test_filler_only_prompt_is_its_own_topic():
+    assert PromptIndex().normalize("latest news") == "latest news"
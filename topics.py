@@ -0,0 +1,139 @@
+"""
+Popular topic tracking and off-peak cache prewarming.
+
+TopicTracker counts how often each prompt and each keyword set is requested
+with Space-Saving heavy-hitter sketches (Metwally et al., 2005): at most
+`capacity` keys are monitored, so memory stays bounded however many distinct
+topics arrive, and any topic whose true share of requests exceeds
+1/capacity is guaranteed to be among them.
+
+PrewarmScheduler periodically runs a prewarm job (keyword generation, source
+fetching and image resolution for the top topics) during configured hours, so
+popular topics find warm caches when demand peaks.
+"""
+import datetime
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_key(prompt):
+    """Case- and whitespace-insensitive key of a prompt"""
+    return ' '.join((prompt or '').lower().split())
+
+
+def keyword_set_key(keywords):
+    """Order- and case-insensitive key of a keyword list"""
+    return '|'.join(sorted({prompt_key(keyword) for keyword in keywords or [] if keyword}))
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitters sketch over at most `capacity` keys.
+
+    A new key arriving when the sketch is full replaces the key with the
+    smallest count and inherits that count as its error, so counts are
+    overestimates by at most `error`. Each key also keeps the latest payload
+    added with it.
+    """
+
+    def __init__(self, capacity=200):
+        self.capacity = capacity
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, payload=None, weight=1):
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                error = 0
+                if len(self._counters) >= self.capacity:
+                    evicted = min(self._counters, key=lambda k: self._counters[k]['count'])
+                    error = self._counters.pop(evicted)['count']
+                counter = self._counters[key] = {'count': error, 'error': error, 'payload': payload}
+            counter['count'] += weight
+            if payload is not None:
+                counter['payload'] = payload
+
+    def top(self, n):
+        """Up to `n` (key, count, error, payload) tuples, highest count first"""
+        with self._lock:
+            items = [(key, c['count'], c['error'], c['payload']) for key, c in self._counters.items()]
+        items.sort(key=lambda item: (-item[1], item[2]))
+        return items[:n]
+
+    def __len__(self):
+        return len(self._counters)
+
+
+class TopicTracker:
+    """Request frequency of prompts (grouped by `prompt_key`) and keyword sets"""
+
+    def __init__(self, capacity=200, prompt_key=prompt_key):
+        self.prompts = SpaceSaving(capacity)
+        self.keyword_sets = SpaceSaving(capacity)
+        self._prompt_key = prompt_key
+
+    def record(self, prompt=None, keywords=None):
+        key = self._prompt_key(prompt) if prompt else None
+        if key:
+            self.prompts.add(key, payload=prompt)
+        if keywords and keyword_set_key(keywords):
+            self.keyword_sets.add(keyword_set_key(keywords), payload=list(keywords))
+
+    def top_prompts(self, n):
+        return [payload for _, _, _, payload in self.prompts.top(n)]
+
+    def top_keyword_sets(self, n):
+        return [payload for _, _, _, payload in self.keyword_sets.top(n)]
+
+
+def parse_hours(spec):
+    """
+    Set of UTC hours from a spec like "0-6,22-23" (an empty spec means every
+    hour). Ranges may wrap midnight ("22-4").
+    """
+    spec = (spec or '').strip()
+    if not spec:
+        return set(range(24))
+    hours = set()
+    for part in spec.split(','):
+        start, _, end = part.strip().partition('-')
+        start = int(start)
+        end = int(end) if end else start
+        if not (0 <= start < 24 and 0 <= end < 24):
+            raise ValueError(f"Hour out of range in {spec!r}")
+        hour = start
+        hours.add(hour)
+        while hour != end:
+            hour = (hour + 1) % 24
+            hours.add(hour)
+    return hours
+
+
+class PrewarmScheduler:
+    """Runs `job()` every `interval` seconds on a daemon thread, only during `hours` (UTC)"""
+
+    def __init__(self, job, interval, hours=None):
+        self._job = job
+        self.interval = interval
+        self.hours = hours if hours is not None else set(range(24))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='topic-prewarm', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if datetime.datetime.now(datetime.timezone.utc).hour not in self.hours:
+                continue
+            try:
+                self._job()
+            except Exception as e:
+                logger.error(f"Topic prewarm failed: {e}")
@@ -0,0 +1,67 @@
+"""
+In-process TTL caches for expensive pipeline results.
+
+Keyword generation, source fetches and image resolution are cached per
+worker for a configurable time so repeated and prewarmed topics skip their
+upstream calls. Values are deep-copied on the way in and out, since the
+pipeline enriches article dicts in place.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import record_cache
+
+
+class TTLCache:
+    """Thread-safe LRU whose entries expire `ttl` seconds after they were stored"""
+
+    def __init__(self, name, max_entries=1000, ttl=600, clock=time.monotonic):
+        self.name = name
+        self.ttl = ttl
+        self._max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= self._clock():
+            del self._entries[key]
+            entry = None
+        return entry
+
+    def get(self, key, max_age=None):
+        """
+        The cached value (a copy) or None; counted as a hit or miss. With
+        `max_age`, entries stored more than `max_age` seconds ago are misses.
+        """
+        with self._lock:
+            entry = self._live(key)
+            if entry is not None and max_age is not None and self._clock() - (entry[0] - self.ttl) > max_age:
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        record_cache(self.name, entry is not None)
+        return copy.deepcopy(entry[1]) if entry is not None else None
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def expires_in(self, key):
+        """Seconds until `key` expires (0 when missing); not counted as a lookup"""
+        with self._lock:
+            entry = self._live(key)
+        return max(0.0, entry[0] - self._clock()) if entry is not None else 0.0
+
+    def __len__(self):
+        return len(self._entries)